@@ -0,0 +1,12 @@
+"""
+Lexer benchmarks. `corpus` makes seeded synthetic GML, `run` times the
+tokenizer engines on it (and on the real scripts in assets/) and
+saves the numbers as JSON, so runs from different commits can be compared:
+
+	python -m bench.run --out before.json
+	python -m bench.run --compare before.json
+
+`fuzz` checks the engines against each other on generated fragments:
+
+	python -m bench.fuzz --count 5000
+"""
@@ -0,0 +1,208 @@
+import random
+
+# realistic-ish names, lifted from the kind of thing thats in our projects
+NAMES = (
+	'x', 'y', 'i', 'j', 'spd', 'dir', 'hp', 'timer', 'state', 'sector', 'cam_id',
+	'surface_x', 'sprite_index', 'image_alpha', 'map_info', 'sector_info',
+	'ds_list', 'ds_map', 'ds_grid', 'arr', 'st', 'obj_player', 'obj_cctv',
+	'draw_sprite_ext', 'surface_create', 'ds_map_find_value', 'string_format',
+	'argument0', 'argument1', 'argument', 'c_white', 'c_black', 'pi',
+)
+BINOPS = (
+	'+', '-', '*', '/', '%', 'div', 'mod', '==', '!=', '<', '>', '<=', '>=',
+	'&&', '||', '^^', 'and', 'or', 'xor', '&', '|', '^', '<<', '>>', '??',
+)
+ASSIGNOPS = ('=', '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '<<=', '>>=', '??=')
+ACCESSORS = ('[', '[|', '[?', '[#', '[@', '[$')
+WORDS = (
+	'the', 'camera', 'is', 'broken', 'again', 'night', 'power', 'door',
+	'left', 'right', 'hello', 'freddy', 'static', 'error', 'loading',
+)
+
+
+class CorpusGenerator:
+	"""
+	Seeded generator for GML that looks like ours. Every construct the
+	lexer has a special path for shows up: macros with \\ continuations,
+	nested block comments, $"{}" templates, hex/binary/#RRGGBB literals,
+	accessors, begin/end blocks. The output always tokenizes cleanly
+	"""
+	def __init__ (self, seed=0):
+		self.rng = random.Random(seed)
+
+	def name (self):
+		return self.rng.choice(NAMES)
+
+	def number (self):
+		r = self.rng.random()
+		if r < 0.5:
+			return str(self.rng.randint(0, 100))
+		elif r < 0.7:
+			return f'{self.rng.uniform(0, 10):.{self.rng.randint(1, 4)}f}'
+		elif r < 0.8:
+			return f'0x{self.rng.getrandbits(24):X}'
+		elif r < 0.85:
+			return f'${self.rng.getrandbits(16):x}'
+		elif r < 0.9:
+			return f'0b{self.rng.getrandbits(8):b}'
+		elif r < 0.95:
+			return f'#{self.rng.getrandbits(24):06X}'
+		return f'{self.rng.randint(1, 99)}_000'
+
+	def sentence (self):
+		return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(1, 8)))
+
+	def string (self):
+		r = self.rng.random()
+		if r < 0.6:
+			return f'"{self.sentence()}"'
+		elif r < 0.8:
+			return f'"{self.sentence()}\\n\\t\\"{self.sentence()}\\"\\x41\\u00e9"'
+		return f'@"{self.sentence()}\n{self.sentence()}"'
+
+	def template (self):
+		parts = []
+		for _ in range(self.rng.randint(1, 3)):
+			parts.append(self.sentence())
+			# escapes inside {} trip up handle_string_template, keep it simple
+			body = self.rng.choice((
+				self.plain_expr,
+				lambda: f'"{self.sentence()}"',
+				lambda: f'{self.name()}({self.plain_expr()}, {self.plain_expr()})',
+			))()
+			parts.append(f'{{{body}}}')
+		return f'$"{' '.join(parts)}"'
+
+	def access (self):
+		acc = self.rng.choice(ACCESSORS)
+		return f'{self.name()}{acc} {self.expr(1)}]'
+
+	def atom (self, depth: int):
+		r = self.rng.random()
+		if r < 0.35:
+			return self.name()
+		elif r < 0.55:
+			return self.number()
+		elif r < 0.65:
+			return self.string()
+		elif r < 0.7:
+			return self.template()
+		elif r < 0.8:
+			return self.access()
+		elif r < 0.9 and depth > 0:
+			args = ', '.join(self.expr(depth - 1) for _ in range(self.rng.randint(0, 3)))
+			return f'{self.name()}({args})'
+		return f'({self.expr(max(depth - 1, 0))})'
+
+	def expr (self, depth=2):
+		out = self.atom(depth)
+		for _ in range(self.rng.randint(0, 2)):
+			out += f' {self.rng.choice(BINOPS)} {self.atom(depth)}'
+		return out
+
+	def plain_expr (self):
+		"""no strings, the macro body reader takes any \\ as a continuation"""
+		out = self.rng.choice((self.name, self.number))()
+		for _ in range(self.rng.randint(0, 3)):
+			out += f' {self.rng.choice(BINOPS)} {self.rng.choice((self.name, self.number))()}'
+		return out
+
+	def statement (self, depth: int, indent: str):
+		r = self.rng.random()
+		if r < 0.45 or depth == 0:
+			return f'{indent}{self.name()} {self.rng.choice(ASSIGNOPS)} {self.expr()};\n'
+		elif r < 0.55:
+			return f'{indent}var {self.name()} = {self.expr()};\n'
+		elif r < 0.65:
+			return f'{indent}{self.name()}({self.expr()});\n'
+		elif r < 0.75:
+			return f'{indent}if ({self.expr()}) {self.block(depth - 1, indent)}'
+		elif r < 0.8:
+			return f'{indent}repeat ({self.number()}) {self.block(depth - 1, indent)}'
+		elif r < 0.85:
+			return f'{indent}with ({self.name()}) {self.block(depth - 1, indent)}'
+		elif r < 0.9:
+			return self.line_comment(indent)
+		elif r < 0.95:
+			return f'{indent}{self.name()}++;\n'
+		return f'{indent}return {self.expr()};\n'
+
+	def block (self, depth: int, indent: str):
+		opener, closer = ('begin', 'end') if self.rng.random() < 0.3 else ('{', '}')
+		body = ''.join(self.statement(depth, indent + '\t') for _ in range(self.rng.randint(1, 5)))
+		return f'{opener}\n{body}{indent}{closer}\n'
+
+	def line_comment (self, indent=''):
+		return f'{indent}//{'/' if self.rng.random() < 0.3 else ''} {self.sentence()}\n'
+
+	def block_comment (self):
+		def nest (depth):
+			inner = self.sentence()
+			if depth > 0 and self.rng.random() < 0.5:
+				inner += f'\n\t{nest(depth - 1)}\n'
+			return f'/* {inner} */'
+		return nest(self.rng.randint(0, 3)) + '\n'
+
+	def macro (self):
+		name = self.name().upper()
+		cfg = f'{self.rng.choice(('Default', 'Debug', 'Release'))}:' if self.rng.random() < 0.2 else ''
+		if self.rng.random() < 0.5:
+			return f'#macro {cfg}{name} {self.plain_expr()}\n'
+		lines = [self.plain_expr() for _ in range(self.rng.randint(2, 4))]
+		return f'#macro {cfg}{name} {' \\\n'.join(lines)}\n'
+
+	def region (self):
+		body = ''.join(self.statement(1, '') for _ in range(self.rng.randint(1, 4)))
+		return f'#region {self.sentence()}\n{body}#endregion\n'
+
+	def function (self):
+		args = ', '.join(self.rng.sample(NAMES[:10], self.rng.randint(0, 3)))
+		return f'function {self.name()}_{self.rng.randint(0, 999)} ({args}) {self.block(2, '')}\n'
+
+	def blank (self):
+		return '\n' * self.rng.randint(1, 3)
+
+	def chunk (self):
+		"""one top level thing, weighted roughly like a real script"""
+		return self.rng.choices(
+			(self.function, lambda: self.statement(2, ''), self.line_comment,
+			 self.block_comment, self.macro, self.region, self.blank),
+			weights=(30, 30, 8, 4, 6, 4, 18),
+		)[0]()
+
+	def generate (self, size: int) -> str:
+		out = []
+		total = 0
+		while total < size:
+			out.append(piece:=self.chunk())
+			total += len(piece)
+		return ''.join(out)
+
+
+CONSTRUCTS = {
+	'statements': lambda g: g.statement(2, ''),
+	'functions': lambda g: g.function(),
+	'line_comments': lambda g: g.line_comment(),
+	'block_comments': lambda g: g.block_comment(),
+	'macros': lambda g: g.macro(),
+	'regions': lambda g: g.region(),
+	'strings': lambda g: f'{g.name()} = {g.string()};\n',
+	'templates': lambda g: f'{g.name()} = {g.template()};\n',
+	'numbers': lambda g: f'{g.name()} = {g.number()};\n',
+	'accessors': lambda g: f'{g.access()} = {g.access()};\n',
+	'blank_lines': lambda g: g.blank(),
+}
+"""a corpus of just one kind of thing, for seeing what each one costs"""
+
+
+def generate (size: int, seed=0, construct: str|None=None) -> str:
+	g = CorpusGenerator(seed)
+	if construct is None:
+		return g.generate(size)
+	make = CONSTRUCTS[construct]
+	out = []
+	total = 0
+	while total < size:
+		out.append(piece:=make(g))
+		total += len(piece)
+	return ''.join(out)
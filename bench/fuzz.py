@@ -0,0 +1,322 @@
+import argparse
+import io
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+import tokenizer
+from gml_keywords import gml_keywords
+from incremental import LexedText
+from instrument import kind_name
+from parallel import MIN_WORKERS, tokenize_parallel
+from scanner import scan_bytes
+from tokarray import ArrayTokens
+from tokens import *
+
+from .corpus import NAMES, CorpusGenerator
+
+# Differential fuzzing: every lexer engine has to come out the same as
+# `tokenizer.tokenize` on whatever the generator comes up with, token for
+# token and span for span. Text that doesnt lex has to fail in all of them.
+#
+#	python -m bench.fuzz --count 5000
+#	python -m bench.fuzz --engine fast --engine bytes --seed 7
+
+
+WORDS = (
+	*NAMES, *gml_keywords,
+	'argument', 'argument0', 'argument9', 'argument15', 'argument16', 'argument99',
+	'argument_count', 'argumentnt', 'argu', 'begin_', '_end', 'endregion', 'Begin', 'END',
+)
+OPS = tuple(OPERATORS) + ('[|', '[?', '[#', '[@', '[$', '...', '=>')
+WHITESPACE = ('', '', ' ', ' ', '\t', '\n', '\r\n', '\n\n', ' \n\t\n', '\r\n\r\n', ' ', '　', '﻿')
+BAD = (
+	'\r', '`', '@x', '\\', '#bogus', '#regionx', '#', '$', '0x', '0b', '#12345', '#1234567', '1..2',
+	'"\n"', '"\\q"', '/* x', '/*/', '"x', '$"{', '$"\\{"', 'é', '#macro M 1 \\ 2',
+)
+
+
+class FragmentGenerator(CorpusGenerator):
+	"""
+	`CorpusGenerator`, but going after the edges instead of looking like
+	real code: tokens jammed together with no whitespace between them,
+	every numeric base, argumentN and begin/end and friends as words and
+	as parts of words, the comment and template quirks, \\r\\n everywhere,
+	and now and then something that doesnt lex at all
+	"""
+	def __init__ (self, seed=0, bad=0.03):
+		super().__init__(seed)
+		self.bad = bad
+
+	def word (self):
+		word = self.rng.choice(WORDS)
+		if self.rng.random() < 0.1:
+			# keywords only count as whole words
+			word += self.rng.choice(('_', '1', 'x', self.rng.choice(WORDS)))
+		return word
+
+	def number (self):
+		r = self.rng.random()
+		if r < 0.6:
+			return super().number()
+		return self.rng.choice((
+			'.5', '1.', '0.', '0', '00', '0_', '1__2', '1.2.3', '0X1f', '0B11', '0x_F', '$_1',
+			'#abcdef', '#ABC_DEF', '12e3', '0x1g', '9' * 25,
+		))
+
+	def string (self):
+		r = self.rng.random()
+		if r < 0.5:
+			return super().string()
+		if self.rng.random() < 0.3:
+			# no escapes in these
+			return '@"' + ''.join(self.rng.choice(('a', ' ', '\\', '\n', '\r\n', '{', "'")) for _ in range(self.rng.randint(0, 6))) + '"'
+		body = ''.join(self.rng.choice(('a', ' ', '\\\\', '\\"', '\\n', '\\x41', '\\u00e9', '\\7', '{', '}', "'")) for _ in range(self.rng.randint(0, 6)))
+		return f'"{body}"'
+
+	def template (self):
+		if self.rng.random() < 0.5:
+			return super().template()
+		parts = []
+		for _ in range(self.rng.randint(0, 4)):
+			parts.append(self.rng.choice((
+				self.sentence(), '}', '{{a}}', '{a}', '{\n}', '{a\nb}', '\\"', '\\\\', '{"s"}', '{$"{x}"}',
+			)))
+		return f'$"{''.join(parts)}"'
+
+	def comment (self):
+		r = self.rng.random()
+		if r < 0.35:
+			return self.line_comment().rstrip('\n') + self.rng.choice(('\n', '\r\n', ''))
+		elif r < 0.9:
+			return self.block_comment().rstrip('\n')
+		# **/ doesnt close one, see tokenizer.skip_multiline_comment
+		return '/*' + ''.join(self.rng.choice(('*', '/', ' ', 'x', '\n', '/**/', '/* */', '**/')) for _ in range(self.rng.randint(0, 8))) + '*/'
+
+	def directive (self):
+		# macros & regions take the rest of the line with them, and a \\
+		# anywhere in a macro is a continuation, so they get a line to themselves
+		r = self.rng.random()
+		if r < 0.5:
+			return self.macro()
+		elif r < 0.6:
+			return f'#macro {self.word()} {self.word()} \\{self.rng.choice(('\n', '\r\n'))}{self.number()}\n'
+		elif r < 0.8:
+			return self.rng.choice(('#region', '#endregion', '#region hello', '#endregion\t//x')) + '\n'
+		return f'#{self.rng.getrandbits(24):06x}'
+
+	def piece (self):
+		if self.rng.random() < self.bad:
+			return self.rng.choice(BAD)
+		return self.rng.choices(
+			(self.word, self.number, self.string, self.template, self.comment, self.directive,
+			 lambda: self.rng.choice(OPS), lambda: self.statement(1, '')),
+			weights=(25, 12, 8, 5, 6, 5, 30, 9),
+		)[0]()
+
+	def fragment (self, pieces: int|None=None) -> str:
+		pieces = pieces or self.rng.randint(1, 30)
+		return ''.join(self.piece() + self.rng.choice(WHITESPACE) for _ in range(pieces))
+
+
+def generate (count: int, seed=0, bad=0.03) -> list[str]:
+	g = FragmentGenerator(seed, bad)
+	return [g.fragment() for _ in range(count)]
+
+
+# Every engine gives back its tokens and their spans (in characters), or
+# None for the spans if it doesnt know them
+
+def _bytes (src: str):
+	tokens = scan_bytes(src.encode('utf8'))
+	if src.isascii():
+		return tokens, list(zip(tokens.starts, tokens.ends))
+	# byte offsets back to character ones
+	chars = {0: 0}
+	pos = 0
+	for i, ch in enumerate(src):
+		pos += len(ch.encode('utf8'))
+		chars[pos] = i + 1
+	return tokens, [(chars[s], chars[e]) for s, e in zip(tokens.starts, tokens.ends)]
+
+
+def _compact (src: str):
+	tokens = ArrayTokens.from_source(src)
+	return tokens, [tokens.span(i) for i in range(len(tokens))]
+
+
+def _stream (src: str):
+	# small chunks, so plenty of tokens get cut in half
+	return list(tokenizer.iter_tokens(io.StringIO(src, newline=''), chunk_size=7)), None
+
+
+_pool = None
+
+def _parallel (src: str):
+	global _pool
+	if _pool is None:
+		# a real process pool, so whats sent back & the stitching get checked too
+		_pool = ProcessPoolExecutor(MIN_WORKERS)
+	tokens = tokenize_parallel(src, MIN_WORKERS, _pool, min_chunk=4)
+	return tokens, list(zip(tokens.starts, tokens.ends))
+
+
+def _incremental (src: str):
+	# cut the middle out and put it back
+	lt = LexedText(src)
+	a, b = len(src) // 3, len(src) * 2 // 3
+	try:
+		lt.edit(a, b - a, '')
+	except tokenizer.LEX_ERRORS:
+		# nothing changed
+		pass
+	else:
+		lt.edit(a, 0, src[a:b])
+	return lt.tokens, list(zip(lt.tokens.starts, lt.tokens.ends))
+
+
+def _spans (lex):
+	def run (src: str):
+		tokens = lex(src)
+		return tokens, list(zip(tokens.starts, tokens.ends))
+	return run
+
+
+ENGINES = dict[str, Callable]({
+	'reference': _spans(tokenizer.tokenize),
+	'fast': _spans(lambda src: tokenizer.tokenize(src, fast=True)),
+	'compact': _compact,
+	'bytes': _bytes,
+	'stream': _stream,
+	'parallel': _parallel,
+	'incremental': _incremental,
+	'reference-recover': _spans(lambda src: tokenizer.tokenize(src, recover=True)),
+	'fast-recover': _spans(lambda src: tokenizer.tokenize(src, fast=True, recover=True)),
+})
+
+
+def baseline (engine: str) -> str:
+	"""what `engine` is checked against by default"""
+	return 'reference-recover' if engine.endswith('-recover') else 'reference'
+
+
+def normalize_token (tk: TokenType | TK) -> tuple:
+	"""
+	something that compares equal for tokens that mean the same thing.
+	Goes by the source of macros & templates, so their bodies (which
+	might not even lex) dont get tokenized
+	"""
+	match tk:
+		case CommentToken():
+			value = tk.multiline, tk.contents
+		case RegionToken():
+			value = tk.is_end, tk.contents
+		case MacroToken():
+			value = tk.name, tk.configuration, tk.source
+		case StringTemplateToken():
+			value = tk.string, tuple(tk.sources)
+		case NumberLiteralToken():
+			# 1 and 1.0 are different tokens
+			value = type(tk.value), tk.value
+		case TK():
+			value = None
+		case _:
+			value = tk
+	return kind_name(tk), value
+
+
+def lex (engine: str, src: str) -> tuple|str:
+	"""normalized (tokens, spans) from `engine`, or the error it raised"""
+	try:
+		tokens, spans = ENGINES[engine](src)
+		return tuple(map(normalize_token, tokens)), spans
+	except tokenizer.LEX_ERRORS as e:
+		return f'{type(e).__name__}: {e}'
+
+
+def same (a: tuple|str, b: tuple|str) -> bool:
+	# theyve both failed, which error comes first doesnt matter
+	if isinstance(a, str) or isinstance(b, str):
+		return isinstance(a, str) and isinstance(b, str)
+	if a[0] != b[0]:
+		return False
+	return a[1] is None or b[1] is None or list(a[1]) == list(b[1])
+
+
+def minimize (src: str, fails: Callable[[str], bool]) -> str:
+	"""
+	delta debugging: keeps cutting pieces out of `src` while it still
+	`fails`, smaller and smaller, till no single character can go
+	"""
+	size = 2
+	while len(src) >= 2:
+		chunk = max(1, len(src) // size)
+		for start in range(0, len(src), chunk):
+			smaller = src[:start] + src[start+chunk:]
+			if fails(smaller):
+				src = smaller
+				size = max(size - 1, 2)
+				break
+		else:
+			if chunk == 1:
+				break
+			size = min(size * 2, len(src))
+	return src
+
+
+def compare (engine: str, against: str, inputs: list[str], shrink=True) -> dict:
+	"""
+	runs both engines over `inputs`, returns the mismatches (minimized if
+	`shrink`) and how long each engine took over all of them
+	"""
+	seconds = {engine: 0.0, against: 0.0}
+	mismatches = []
+	for src in inputs:
+		t = time.perf_counter()
+		a = lex(engine, src)
+		seconds[engine] += time.perf_counter() - t
+		t = time.perf_counter()
+		b = lex(against, src)
+		seconds[against] += time.perf_counter() - t
+		if not same(a, b):
+			if shrink:
+				src = minimize(src, lambda s: not same(lex(engine, s), lex(against, s)))
+			mismatches.append({'source': src, engine: lex(engine, src), against: lex(against, src)})
+	return {'engine': engine, 'against': against, 'inputs': len(inputs), 'mismatches': mismatches, 'seconds': seconds}
+
+
+def report (result: dict, show=3):
+	engine, against = result['engine'], result['against']
+	secs = result['seconds']
+	speed = secs[against] / secs[engine] if secs[engine] else float('inf')
+	print(f'{engine:>17} vs {against:<17} {len(result['mismatches']):>5} mismatches of {result['inputs']:,}'
+		  f'  {secs[engine]:7.3f}s vs {secs[against]:7.3f}s  ({speed:.2f}x)')
+	for m in result['mismatches'][:show]:
+		print(f'\t{m['source']!r}')
+		print(f'\t  {engine}: {m[engine]}')
+		print(f'\t  {against}: {m[against]}')
+
+
+def main (argv=None):
+	ap = argparse.ArgumentParser(prog='python -m bench.fuzz', description='check the lexer engines against each other')
+	ap.add_argument('--count', type=int, default=2000, help='fragments to generate')
+	ap.add_argument('--seed', type=int, default=0)
+	ap.add_argument('--bad', type=float, default=0.03, help='chance of each piece being something that doesnt lex')
+	ap.add_argument('--engine', action='append', choices=tuple(ENGINES), help='can be given more than once, default is all of them')
+	ap.add_argument('--against', choices=tuple(ENGINES), help='default is reference, or reference-recover for the -recover ones')
+	ap.add_argument('--no-minimize', action='store_true', help='dont shrink mismatches')
+	args = ap.parse_args(argv)
+
+	inputs = generate(args.count, args.seed, args.bad)
+	engines = args.engine or [e for e in ENGINES if e != baseline(e)]
+	failed = False
+	for engine in engines:
+		result = compare(engine, args.against or baseline(engine), inputs, not args.no_minimize)
+		report(result)
+		failed |= len(result['mismatches']) > 0
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,136 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import tokenizer
+from scanner import scan_bytes
+from tokarray import ArrayTokens
+
+from . import corpus
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = ROOT/'assets'/'draw_rout_cctv.gml'
+
+ENGINES = {
+	'reference': lambda src: tokenizer.tokenize(src),
+	'fast': lambda src: tokenizer.tokenize(src, fast=True),
+	'compact': lambda src: ArrayTokens.from_source(src),
+	# utf8 in, like tokenizer.main(mapped=True) gets from its mmap
+	'bytes': lambda src: scan_bytes(src.encode('utf8')),
+}
+
+
+def _commit () -> str|None:
+	try:
+		out = subprocess.run(
+			['git', 'rev-parse', '--short', 'HEAD'],
+			cwd=ROOT, capture_output=True, text=True, check=True,
+		)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return out.stdout.strip()
+
+
+def measure (lex, src: str, repeat=5) -> dict:
+	"""best of `repeat` runs, then one more under tracemalloc for the peak"""
+	best = float('inf')
+	count = 0
+	for _ in range(repeat):
+		t = time.perf_counter()
+		count = len(lex(src))
+		best = min(best, time.perf_counter() - t)
+	# timing with tracemalloc on is way off, so this run is only for memory
+	tracemalloc.start()
+	try:
+		tokens = lex(src)
+		peak = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+	del tokens
+	size = len(src.encode('utf8'))
+	return {
+		'tokens': count,
+		'bytes': size,
+		'seconds': best,
+		'tokens_per_sec': count / best,
+		'mb_per_sec': size / best / 1e6,
+		'peak_bytes': peak,
+	}
+
+
+def run (size=1<<20, seed=0, repeat=5, engines=tuple(ENGINES)) -> dict:
+	inputs = {
+		'baseline': BASELINE.read_text('utf8'),
+		'corpus': corpus.generate(size, seed),
+	}
+	# smaller, since theres one per construct
+	for name in corpus.CONSTRUCTS:
+		inputs[f'construct:{name}'] = corpus.generate(size // 8, seed, name)
+
+	results = dict[str, dict]()
+	for engine in engines:
+		lex = ENGINES[engine]
+		results[engine] = {name: measure(lex, src, repeat) for name, src in inputs.items()}
+		# per construct cost, in nanoseconds per token and per byte
+		for name, r in results[engine].items():
+			if name.startswith('construct:'):
+				r['ns_per_token'] = r['seconds'] / r['tokens'] * 1e9 if r['tokens'] else 0.0
+				r['ns_per_byte'] = r['seconds'] / r['bytes'] * 1e9
+	return {
+		'commit': _commit(),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+		'size': size,
+		'seed': seed,
+		'repeat': repeat,
+		'results': results,
+	}
+
+
+def _change (new: float, old: float) -> str:
+	return f'{new / old - 1:+.1%}' if old else '   n/a'
+
+
+def report (data: dict, old: dict|None=None):
+	print(f'commit {data['commit']}  python {data['python']}  corpus {data['size']:,}B seed {data['seed']}')
+	for engine, inputs in data['results'].items():
+		print(f'\n{engine}')
+		print(f'  {'input':<28}{'tokens':>10}{'tok/s':>12}{'MB/s':>8}{'peak MB':>9}')
+		for name, r in inputs.items():
+			line = f'  {name:<28}{r['tokens']:>10,}{r['tokens_per_sec']:>12,.0f}{r['mb_per_sec']:>8.2f}{r['peak_bytes']/1e6:>9.1f}'
+			if old is not None and (o:=old['results'].get(engine, {}).get(name)) is not None:
+				# by time, not tok/s, so fewer tokens for the same text doesnt
+				# look slower. positive is faster than before
+				change = o['seconds'] / r['seconds'] - 1
+				line += f'  {change:+7.1%}'
+				line += f'  tokens {_change(r['tokens'], o['tokens'])}  peak {_change(r['peak_bytes'], o['peak_bytes'])}'
+			print(line)
+
+
+def main (argv=None):
+	ap = argparse.ArgumentParser(prog='python -m bench.run', description='benchmark the tokenizer')
+	ap.add_argument('--size', type=int, default=1<<20, help='bytes of synthetic corpus')
+	ap.add_argument('--seed', type=int, default=0)
+	ap.add_argument('--repeat', type=int, default=5, help='runs per input, the best one counts')
+	ap.add_argument('--engine', action='append', choices=tuple(ENGINES), help='can be given more than once, default is all')
+	ap.add_argument('--out', type=Path, help='save the results here as json')
+	ap.add_argument('--compare', type=Path, help='json from an earlier run to compare against')
+	args = ap.parse_args(argv)
+
+	old = json.loads(args.compare.read_text('utf8')) if args.compare else None
+	data = run(args.size, args.seed, args.repeat, tuple(args.engine or ENGINES))
+	report(data, old)
+	if args.out is not None:
+		args.out.write_text(json.dumps(data, indent='\t'), 'utf8')
+	return data
+
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
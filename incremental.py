@@ -0,0 +1,164 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+from scanner import scan, scan_from
+from tokenizer import Symbols, Constants
+from tokens import *
+
+
+class LexedText:
+	"""
+	Source text along with its tokens and where each of them is, kept up
+	to date across edits without re-lexing the whole thing.
+
+	The lexer doesnt carry any state from one token to the next, so lexing
+	from any token boundary gives the same tokens a full lex would. An edit
+	re-lexes from the last top level run of newlines before it (a
+	`NewlineToken` can never be inside a comment, @"" string or $"" template,
+	those are single tokens) and stops as soon as a new token starts where an
+	old one did, past the edit; everything after that is the same as
+	before, just moved over.
+	"""
+	def __init__ (self, src: str, handle_whack_as_newline=False):
+		self.handle_whack_as_newline = handle_whack_as_newline
+		# kept across edits, so re-lexed identifiers & literals are the same tokens as before
+		self.symbols = Symbols()
+		self.constants = Constants()
+		self._tokens = scan(src, handle_whack_as_newline, symbols=self.symbols, constants=self.constants)
+		# Shifting every span after an edit is O(file), so its put off:
+		# the span of token n is whats stored plus `_shifts[m]`, m being
+		# the last of `_marks` at or before n. `tokens` applies them all
+		self._marks = list[int]()
+		self._deltas = list[int]()
+		self._shifts = list[int]()
+
+	MAX_MARKS = 256
+	"""edits to put off shifting for, before theyre all done in one go"""
+
+	@property
+	def tokens (self) -> Tokens:
+		self.flush()
+		return self._tokens
+
+	@property
+	def src (self) -> str:
+		return self._tokens.source
+
+	def __len__ (self):
+		return len(self._tokens)
+
+	def _shift (self, index: int) -> int:
+		if (m:=bisect_right(self._marks, index)) == 0:
+			return 0
+		return self._shifts[m-1]
+
+	def _find (self, where: array, x: int, right: bool) -> int:
+		"""bisect_right (or _left) of `x` in the shifted `where`"""
+		lo, hi = 0, len(where)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			v = where[mid] + self._shift(mid)
+			if v < x or (right and v == x):
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+
+	def span (self, index: int):
+		start, end = self._tokens.span(index)
+		shift = self._shift(index)
+		return start + shift, end + shift
+
+	def flush (self):
+		"""shifts every span thats still waiting to be"""
+		if len(self._marks) == 0:
+			return
+		starts, ends = self._tokens.starts, self._tokens.ends
+		bounds = [*self._marks, len(starts)]
+		for a, b, shift in zip(bounds, bounds[1:], self._shifts):
+			if shift != 0 and a < b:
+				starts[a:b] = array('i', map(shift.__add__, starts[a:b]))
+				ends[a:b] = array('i', map(shift.__add__, ends[a:b]))
+		self._marks.clear()
+		self._deltas.clear()
+		self._shifts.clear()
+
+	def edit (self, offset: int, removed: int, inserted: str) -> slice:
+		"""
+		Replaces `removed` characters at `offset` with `inserted`, then
+		re-lexes what it has to. Returns the slice of `tokens` that was
+		replaced. If the new text doesnt lex the error is raised and
+		nothing is changed. The tokens after the edit arent touched, how
+		far they moved is noted down instead (see `span` & `flush`), so
+		an edit costs about as much as what gets re-lexed
+		"""
+		src = self.src[:offset] + inserted + self.src[offset+removed:]
+		delta = len(inserted) - removed
+		tokens = self._tokens
+		starts, ends = tokens.starts, tokens.ends
+		at = lambda where, n: where[n] + self._shift(n)
+
+		# tokens[:i] all end before the edit. back up to a newline, since
+		# the last few might have been cut short by the lookahead
+		i = self._find(ends, offset, True)
+		while i > 0 and not isinstance(tokens[i-1], NewlineToken):
+			i -= 1
+		# and re-lex the run too, the edit might make it longer
+		restart = 0
+		if i > 0:
+			i -= 1
+			restart = at(starts, i)
+
+		edit_end = offset + len(inserted)
+		j = self._find(starts, offset + removed, False)
+		new_starts, new_ends = array('i'), array('i')
+		relexed = list[TokenType | TK]()
+		for tk in scan_from(src, restart, self.handle_whack_as_newline, starts=new_starts, ends=new_ends, symbols=self.symbols, constants=self.constants):
+			if (start:=new_starts[-1]) >= edit_end:
+				# lexing from here on is the same as lexing the old text
+				# from start-delta, so if a token started there were done
+				old = start - delta
+				while j < len(starts) and at(starts, j) < old:
+					j += 1
+				if j < len(starts) and at(starts, j) == old:
+					new_starts.pop()
+					new_ends.pop()
+					break
+			relexed.append(tk)
+		else:
+			j = len(tokens)
+
+		# the new spans are stored less the shift thats already on them
+		if (base:=self._shift(i)) != 0:
+			new_starts = array('i', map((-base).__add__, new_starts))
+			new_ends = array('i', map((-base).__add__, new_ends))
+		# plain list assignment, starts & ends are handled right here
+		tokens[i:j] = relexed
+		starts[i:j] = new_starts
+		ends[i:j] = new_ends
+		k = i + len(relexed)
+		tokens.source = src
+
+		# marks past i move with the tokens after the edit (the ones
+		# in the middle of it to where it ends), then theres a new one
+		marks, deltas = list[int](), list[int]()
+		for m, d in zip(self._marks, self._deltas):
+			m = m if m <= i else max(k, m - j + k)
+			if len(marks) > 0 and marks[-1] == m:
+				deltas[-1] += d
+			else:
+				marks.append(m)
+				deltas.append(d)
+		if delta != 0:
+			n = bisect_right(marks, k)
+			if n > 0 and marks[n-1] == k:
+				deltas[n-1] += delta
+			else:
+				marks.insert(n, k)
+				deltas.insert(n, delta)
+		self._marks, self._deltas = marks, deltas
+		self._shifts = list(accumulate(deltas))
+		if len(marks) > self.MAX_MARKS:
+			self.flush()
+		return slice(i, k)
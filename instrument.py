@@ -0,0 +1,74 @@
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, TypeAlias
+
+from tokens import *
+
+log = logging.getLogger('tokenizer')
+
+Trace: TypeAlias = Callable[[TokenType | TK, slice, tuple], None]
+"""called with every token as its added, where it is, and its metadata"""
+
+
+def log_trace (tk: TokenType | TK, location: slice, metadata: tuple):
+	"""a `Trace` that logs what `tokenize` used to print, at DEBUG"""
+	if log.isEnabledFor(logging.DEBUG):
+		log.debug('%s:\n\t%s\n\t[%s]', tk, location, ', '.join(map(repr, metadata)))
+
+
+def kind_name (tk: TokenType | TK) -> str:
+	return tk.name if isinstance(tk, TK) else type(tk).__name__
+
+
+def handler_name (tk: TokenType | TK) -> str | None:
+	"""which of the tokenizers handlers made `tk`, if any"""
+	match tk:
+		case StringLiteralToken():
+			return 'handle_string'
+		case StringTemplateToken():
+			return 'handle_string_template'
+		case NumberLiteralToken():
+			return 'handle_number'
+		case MacroToken():
+			return 'handle_macro'
+		case CommentToken() if tk.multiline:
+			return 'read_multiline_comment'
+	return None
+
+
+@dataclass
+class LexStats:
+	"""
+	Counters filled in by `tokenize(..., stats=LexStats())`. The time for a
+	token is everything since the one before it, so whitespace in front
+	of a token gets counted towards it
+	"""
+	tokens: int = 0
+	bytes: int = 0
+	seconds: float = 0.0
+	counts: Counter[str] = field(default_factory=Counter)
+	"""tokens per kind (TK member name or token class name)"""
+	kind_seconds: Counter[str] = field(default_factory=Counter)
+	handler_seconds: Counter[str] = field(default_factory=Counter)
+	"""time spent in handle_string, handle_number, handle_macro..."""
+
+	def record (self, tk: TokenType | TK, seconds: float):
+		kind = kind_name(tk)
+		self.tokens += 1
+		self.counts[kind] += 1
+		self.kind_seconds[kind] += seconds
+		if (handler:=handler_name(tk)) is not None:
+			self.handler_seconds[handler] += seconds
+
+	def finish (self, size: int, seconds: float):
+		self.bytes += size
+		self.seconds += seconds
+
+	@property
+	def bytes_per_sec (self):
+		return self.bytes / self.seconds if self.seconds else 0.0
+
+	@property
+	def tokens_per_sec (self):
+		return self.tokens / self.seconds if self.seconds else 0.0
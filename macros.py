@@ -0,0 +1,185 @@
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import tokenizer
+from tokens import *
+
+
+class MacroError(Exception):
+	pass
+
+
+class MacroCycleError(MacroError):
+	pass
+
+
+class MacroTable:
+	"""
+	Every `#macro` in a project, by name and configuration, and the
+	machinery to expand them.
+
+	A macro with a configuration (`#macro Debug:LOG_LEVEL 3`) beats the
+	plain one when `configuration` is that one, otherwise the plain
+	one is used. Fully expanded bodies are memoized, so a macro thats used
+	ten thousand times is only expanded once. Whichever identifiers an
+	expansion looked at are remembered too, so when a file changes only
+	the expansions that could have come out different get thrown away.
+	"""
+	def __init__ (self, configuration: str|None=None):
+		self.configuration = configuration
+		# name -> configuration (None for plain) -> every (definition, file
+		# it came from) in the order they were added, the last one is used
+		self.defs = dict[str, dict[str|None, list[tuple[MacroToken, Path|None]]]]()
+		self._files = dict[Path|None, list[tuple[str, str|None]]]()
+		self._expanded = dict[str, tuple[TokenType | TK, ...]]()
+		# identifier -> macros whose expansion looked it up
+		self._users = dict[str, set[str]]()
+
+	@classmethod
+	def from_project (cls, root: str|Path, configuration: str|None=None, workers: int|None=None):
+		from project import tokenize_project
+		table = cls(configuration)
+		result = tokenize_project(root, workers)
+		for path, r in result.results.items():
+			if r.error is not None:
+				raise MacroError(f'{path}: {r.error}')
+			table.add_tokens(r.tokens, path)
+		return table
+
+	def __contains__ (self, name: str):
+		return name in self.defs
+
+	def __len__ (self):
+		return sum(map(len, self.defs.values()))
+
+	def add (self, macro: MacroToken, path: str|Path|None=None) -> set[str]:
+		"""
+		adding a name that already exists shadows it, last one wins. The
+		one it shadowed comes back if the file that added this is removed
+		"""
+		path = None if path is None else Path(path)
+		self.defs.setdefault(macro.name, {}).setdefault(macro.configuration, []).append((macro, path))
+		self._files.setdefault(path, []).append((macro.name, macro.configuration))
+		return self.invalidate({macro.name})
+
+	def add_tokens (self, tokens: Iterable[TokenType | TK], path: str|Path|None=None):
+		for tk in tokens:
+			if isinstance(tk, MacroToken):
+				self.add(tk, path)
+
+	def remove_file (self, path: str|Path|None) -> set[str]:
+		"""drops every macro `path` defined, returns the expansions that got thrown away"""
+		path = None if path is None else Path(path)
+		changed = set[str]()
+		for name, cfg in self._files.pop(path, ()):
+			if (by_cfg:=self.defs.get(name)) is None or (stack:=by_cfg.get(cfg)) is None:
+				continue
+			# whatever was defined before it (by another file) is back
+			kept = [entry for entry in stack if entry[1] != path]
+			if len(kept) == len(stack):
+				continue
+			# the ones under it dont change anything
+			if stack[-1][1] == path:
+				changed.add(name)
+			if len(kept) > 0:
+				by_cfg[cfg] = kept
+			else:
+				del by_cfg[cfg]
+				if len(by_cfg) == 0:
+					del self.defs[name]
+		return self.invalidate(changed)
+
+	def update_file (self, path: str|Path, tokens: Iterable[TokenType | TK]|None=None) -> set[str]:
+		"""
+		re-reads the macros in `path` (or takes them from `tokens`, if its
+		already been tokenized), returns the expansions that got thrown away
+		"""
+		path = Path(path)
+		if tokens is None:
+			tokens = tokenizer.tokenize(path.read_text('utf8'), fast=True)
+		dropped = self.remove_file(path)
+		for tk in tokens:
+			if isinstance(tk, MacroToken):
+				dropped |= self.add(tk, path)
+		return dropped
+
+	def set_configuration (self, configuration: str|None):
+		if configuration != self.configuration:
+			self.configuration = configuration
+			self._expanded.clear()
+			self._users.clear()
+
+	def invalidate (self, names: Iterable[str]) -> set[str]:
+		"""
+		throws away the expansions of `names` and everything that used them,
+		returns the names of the ones that were actually memoized
+		"""
+		dropped = set[str]()
+		todo = list(names)
+		seen = set(todo)
+		while todo:
+			name = todo.pop()
+			if self._expanded.pop(name, None) is not None:
+				dropped.add(name)
+			for user in self._users.pop(name, ()):
+				if user not in seen:
+					seen.add(user)
+					todo.append(user)
+		return dropped
+
+	def lookup (self, name: str) -> MacroToken|None:
+		if (by_cfg:=self.defs.get(name)) is None:
+			return None
+		if (stack:=by_cfg.get(self.configuration)) is None and (stack:=by_cfg.get(None)) is None:
+			# only defined for some other configuration
+			return None
+		return stack[-1][0]
+
+	def expand (self, name: str) -> tuple[TokenType | TK, ...]:
+		"""
+		the body of macro `name` with every macro in it expanded, all the
+		way down. Newlines from \\ continuations and comments are left out
+		"""
+		if (out:=self._expanded.get(name)) is not None:
+			return out
+		return self._expand(name, [])
+
+	def _expand (self, name: str, stack: list[str]):
+		if name in stack:
+			cycle = ' -> '.join(stack[stack.index(name):] + [name])
+			raise MacroCycleError(f'Macro refers to itself: {cycle}')
+		if (macro:=self.lookup(name)) is None:
+			raise MacroError(f'Unknown macro "{name}"')
+		stack.append(name)
+		out = list[TokenType | TK]()
+		for tk in macro.body:
+			if isinstance(tk, (NewlineToken, CommentToken)):
+				continue
+			if isinstance(tk, IdentifierToken):
+				# remember the lookup even if its not a macro (yet)
+				self._users.setdefault(tk.name, set()).add(name)
+				if self.lookup(tk.name) is not None:
+					if (sub:=self._expanded.get(tk.name)) is None:
+						sub = self._expand(tk.name, stack)
+					out.extend(sub)
+					continue
+			out.append(tk)
+		stack.pop()
+		out = self._expanded[name] = tuple(out)
+		return out
+
+	def expand_tokens (self, tokens: Iterable[TokenType | TK]) -> Iterator[TokenType | TK]:
+		"""
+		`tokens`, with identifiers that name a macro swapped for its
+		expansion as its iterated. `MacroToken`s themselves are passed
+		through as is
+		"""
+		lookup = self.lookup
+		expanded = self._expanded
+		for tk in tokens:
+			if isinstance(tk, IdentifierToken) and lookup(tk.name) is not None:
+				if (sub:=expanded.get(tk.name)) is None:
+					sub = self._expand(tk.name, [])
+				yield from sub
+			else:
+				yield tk
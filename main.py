@@ -1,3 +1,4 @@
+from itertools import chain
 from pathlib import Path
 import tokenizer
 from tokens import *
@@ -12,7 +13,7 @@ def script_name (name:str,root=SCRIPTS):
 
 def mm ():
 	print('---- BEGIN ----')
-	result = tokenizer.main(
+	targ = (
 		script_name('__scr_ai_oldStep')
 		# script_name('scr_menu_night6')
 		# ASSETS/'draw_rout_cctv.gml'
@@ -25,31 +26,31 @@ def mm ():
 		# ASSETS/'multiline_macro_test.gml'
 		# ASSETS/'strings_test.gml'
 	)
-	return
 
 	depth = 0
 	scope_incr = False
 	scope_decr = False
-	for token in result:
-		match token:
-			case TK() if token.is_special_accessor():
-				scope_incr = True
-			case LBraceToken() | TK.L_BRACKET | TK.L_WHIFFLE | TK.SPECIAL_ACCESSOR:
-				scope_incr = True
-			case RBraceToken() | TK.R_BRACKET | TK.R_WHIFFLE:
-				scope_decr = True
-			case RegionToken():
-				(scope_decr:=True) if token.is_end else (scope_incr:=True)
-		depth -= scope_decr
-		ident = '\t' * depth
-		depth += scope_incr
-		scope_incr = scope_decr = False
-		match token:
-			case TK() as tk:
-				outs = tk.value
-			case _:
-				outs = token
-		print(f'{ident}{outs}')
+	with open(targ, encoding='utf8') as fp:
+		for token in chain(tokenizer.iter_tokens(fp), [EOF()]):
+			match token:
+				case TK() if token.is_special_accessor():
+					scope_incr = True
+				case LBraceToken() | TK.L_BRACKET | TK.L_WHIFFLE | TK.SPECIAL_ACCESSOR:
+					scope_incr = True
+				case RBraceToken() | TK.R_BRACKET | TK.R_WHIFFLE:
+					scope_decr = True
+				case RegionToken():
+					(scope_decr:=True) if token.is_end else (scope_incr:=True)
+			depth -= scope_decr
+			ident = '\t' * depth
+			depth += scope_incr
+			scope_incr = scope_decr = False
+			match token:
+				case TK() as tk:
+					outs = tk.value
+				case _:
+					outs = token
+			print(f'{ident}{outs}')
 	print('----  END  ----')
 
 if __name__ == '__main__':
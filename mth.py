@@ -1,5 +1,5 @@
+import re
 import string
-import io
 
 kinda_gml_whitespace = (
 	' \t\v\f'
@@ -21,67 +21,92 @@ all_gml_whitespace = '\r\n'+kinda_gml_whitespace
 "https://manual.yoyogames.com/#t=Additional_Information%2FWhitespace_Characters.htm"
 
 
+# character classes, as sets so checking one is a single hash lookup
+letter_chars = frozenset(string.ascii_letters)
+digit_chars = frozenset(string.digits)
+identifier_chars = letter_chars | digit_chars | {'_'}
+number_lit_chars = digit_chars | {'_'}
+number_hex_chars = frozenset(string.hexdigits) | {'_'}
+number_bin_chars = frozenset('_01')
+whitespace_chars = frozenset(kinda_gml_whitespace)
+
+
+def run_of (chars: frozenset[str]) -> re.Pattern:
+	"""regex for one or more of `chars` in a row, see `StringReader.take_run`"""
+	return re.compile(f'[{re.escape(''.join(sorted(chars)))}]+')
+
+identifier_run = run_of(identifier_chars)
+number_lit_run = run_of(number_lit_chars)
+number_hex_run = run_of(number_hex_chars)
+number_bin_run = run_of(number_bin_chars)
+whitespace_run = run_of(whitespace_chars)
+
+
+# '' counts as every class, like it did back when these were `ch in
+# string.digits` and the like. Peeking past the end of the text gives ''
+# and the lexer depends on what happens then, so its kept
+
 def is_letter (ch: str):
-	return ch in string.ascii_letters
+	return ch in letter_chars or ch == ''
 
 def is_number (ch: str):
-	return ch in string.digits
+	return ch in digit_chars or ch == ''
 
 def is_identifier (ch: str):
-	return is_letter(ch) or is_number(ch) or ch == '_'
+	return ch in identifier_chars or ch == ''
 
 def is_allowed_number_hex (ch: str):
-	return ch in string.hexdigits or ch == '_'
+	return ch in number_hex_chars or ch == ''
+
+class DigestStringError(Exception):
+	pass
 
-def is_allowed_number_bin (ch: str):
-	return ch in '_01'
+_SIMPLE_ESCAPES = {
+	'\\': '\\', '"': '"',
+	'r': '\x0D', 'n': '\x0A', 'b': '\x08', 'f': '\x0C',
+	't': '\x09', 'v': '\x0B', 'a': '\x07',
+}
+_NUM_ESCAPES = {
+	'u': (4, 16, 'unicode'),
+	'x': (2, 16, 'hex'),
+}
 
-def is_allowed_number_lit (ch: str):
-	return is_number(ch) or ch == '_'
+def _read_esc_num (s: str, at: int, length: int, base: int, typeof: str):
+	try:
+		chars = s[at:at+length]
+		if len(chars) < length:
+			raise DigestStringError(f'Not enough chars for {typeof} esc seq: "{chars}"')
+		return chr(int(chars, base))
+	except Exception as e:
+		raise DigestStringError(f'Problem digesting string {typeof} escape seq: {e}')
 
 def digest_string (s: str):
 	# gurgle -v-"
-	class DigestStringError(Exception):
-		pass
-
-	# i would use newline=None, but that brings up questions
-	# relating to slicing and seek position. oh well. guess ill have
-	# to handle windows style newlines myself anyways -_-
-	f = io.StringIO(s)
-	def read_esc_num (length: int, base: int, typeof: str):
-		try:
-			t = f.tell()
-			chars = s[t:t+length]
-			if len(chars) < length:
-				raise DigestStringError(f'Not enough chars for {typeof} esc seq: "{chars}"')
-			v = int(chars, base)
-			f.seek(t + length)
-			return chr(v)
-		except Exception as e:
-			raise DigestStringError(f'Problem digesting string {typeof} escape seq: {e}')
-
-	outs = ''
-	for ch in iter(lambda: f.read(1), ''):
-		if ch == '\\':
-			ch = f.read(1)
-			match ch:
-				case '\\' | '"': pass # the character escaped is the same as the seq
-				case 'r': ch = '\x0D'
-				case 'n': ch = '\x0A'
-				case 'b': ch = '\x08'
-				case 'f': ch = '\x0C'
-				case 't': ch = '\x09'
-				case 'v': ch = '\x0B'
-				case 'a': ch = '\x07'
-				case 'u': ch = read_esc_num(4, 16, 'unicode')
-				case 'x': ch = read_esc_num(2, 16, 'hex')
-				case _ if '0' <= ch <= '7':
-					f.seek(-1, io.SEEK_CUR)
-					ch = read_esc_num(1, 8, 'octal')
-				case '':
-					raise DigestStringError(f'Hit end of string before finding escape sequence type!')
-				case _:
-					raise DigestStringError(f'Unknown string escape sequence \\{ch}!')
-		outs += ch
-	return outs
+	# nearly every string has no escapes at all
+	if (i:=s.find('\\')) < 0:
+		return s
 
+	# copy everything between escapes over in one go, instead of a
+	# character at a time
+	outs = []
+	start = 0
+	end = len(s)
+	while i >= 0:
+		outs.append(s[start:i])
+		if i + 1 >= end:
+			raise DigestStringError(f'Hit end of string before finding escape sequence type!')
+		ch = s[i+1]
+		start = i + 2
+		if (esc:=_SIMPLE_ESCAPES.get(ch)) is not None:
+			outs.append(esc)
+		elif (num:=_NUM_ESCAPES.get(ch)) is not None:
+			length, base, typeof = num
+			outs.append(_read_esc_num(s, start, length, base, typeof))
+			start += length
+		elif '0' <= ch <= '7':
+			outs.append(chr(int(ch, 8)))
+		else:
+			raise DigestStringError(f'Unknown string escape sequence \\{ch}!')
+		i = s.find('\\', start)
+	outs.append(s[start:])
+	return ''.join(outs)
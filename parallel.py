@@ -0,0 +1,238 @@
+import os
+import re
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from scanner import scan_from
+from strreader import StringReader
+from tokenizer import (
+	WORD_TOKENS, NEWLINE_RUN, LEX_ERRORS, ParseError, Constants,
+	skip_multiline_comment, handle_directive, _STRING_BODY, _TEMPLATE_STOPS,
+)
+from tokens import *
+
+# Anything at the top level of a file that a newline can be inside of, or
+# that could be mistaken for one. Accessors come first so [@" and [$" are
+# an accessor and a plain string, like the lexer sees them
+_INTERESTING = re.compile(r'\[[|?#@$]|//|/\*|@"|\$"|"|#|\n')
+
+
+def _template_end (src: str, pos: int) -> int:
+	"""
+	just past the closing " of the template whose text starts at `pos`,
+	or -1 if it doesnt have one. Same walk as `handle_string_template`,
+	without keeping anything
+	"""
+	depth = 0
+	search = _TEMPLATE_STOPS.search
+	while (m:=search(src, pos)) is not None:
+		p = m.start()
+		ch = src[p]
+		pos = p + 1
+		if ch == '\\':
+			ch = src[p+1:p+2]
+			pos = p + 2
+			if ch != '{' and ch != '}':
+				continue
+		if ch == '{':
+			depth += 1
+		elif ch == '}':
+			depth = max(depth - 1, 0)
+		elif depth == 0:
+			# a newline or the end of it
+			return pos if ch == '"' else -1
+	return -1
+
+
+def split_points (src: str, parts: int) -> list[int]:
+	"""
+	Up to `parts`-1 offsets, roughly evenly spaced, that a token starts at
+	(or only whitespace does) when lexing `src` from the start, so lexing
+	from any of them gives the same tokens. They're all just past a top
+	level newline. Comments, strings and templates are jumped over
+	without making anything, directives go through the lexers handler.
+	If one of them is broken the lexer is going to fail there anyway, so
+	theres no splitting past it
+	"""
+	size = len(src)
+	targets = [size * i // parts for i in range(1, parts)]
+	points = list[int]()
+	f = None
+	search = _INTERESTING.search
+	pos = 0
+	while len(points) < len(targets) and (m:=search(src, pos)) is not None:
+		found = m.group()
+		pos = m.end()
+		match found:
+			case '\n':
+				# past the whole run, splitting one would make it two tokens
+				pos = NEWLINE_RUN.match(src, m.start()).end()
+				if pos >= targets[len(points)] and pos < size:
+					points.append(pos)
+				continue
+			case '//':
+				# ends just past the newline, which is as good as a newline
+				pos = src.find('\n', pos)
+			case '/*':
+				try:
+					pos = skip_multiline_comment(src, pos)
+				except ParseError:
+					break
+			case '"':
+				pos = _STRING_BODY.match(src, pos).end()
+				pos = pos + 1 if src[pos:pos+1] == '"' else -1
+			case '@"':
+				if (pos:=src.find('"', pos)) >= 0:
+					pos += 1
+			case '$"':
+				pos = _template_end(src, pos)
+			case '#':
+				# macros with \ continuations, regions (which eat their
+				# newline, but theres bound to be another one soon)
+				if f is None:
+					f = StringReader(src)
+				f.goto(pos)
+				try:
+					handle_directive(f, m.start())
+				except Exception:
+					break
+				pos = f.tell()
+		if pos < 0:
+			break
+	return points
+
+
+def lex_chunk (src: str, base: int) -> tuple[list, array, array, array, array, Constants]:
+	"""
+	lexes one piece of a file, on the pool. Comes back as each different
+	token once, which of them is at each index, the spans and the line
+	starts, all already moved to where `src` is in the whole text (`base`),
+	and the literals by spelling. Thats a lot less to pickle and unpickle
+	than a token object for each one
+	"""
+	starts, ends = array('i'), array('i')
+	lines = array('i', [0])
+	constants = Constants()
+	tokens = list(scan_from(src, 0, False, True, base, starts, ends, constants=constants, lines=lines))
+	# the line `src` starts on, the parent has that one already
+	return _pack(tokens, starts, ends, lines[1:], constants, base)
+
+
+def _pack (
+	tokens: list, starts: array, ends: array, lines: array, constants: Constants, base=0,
+) -> tuple[list, array, array, array, array, Constants]:
+	# identifiers & literals are already shared within one scan
+	distinct = {id(tk): tk for tk in tokens}
+	index = dict(zip(distinct, range(len(distinct))))
+	ids = array('i', map(index.__getitem__, map(id, tokens)))
+	table = list(distinct.values())
+	for tk in table:
+		# comments & regions point into `src`, the parent points them at the whole text
+		if isinstance(tk, (CommentToken, RegionToken)) and isinstance(where:=tk._contents, slice):
+			tk._contents = slice(where.start + base, where.stop + base)
+			tk._source = None
+	if base != 0:
+		starts = array('i', map(base.__add__, starts))
+		ends = array('i', map(base.__add__, ends))
+		lines = array('i', map(base.__add__, lines))
+	return table, ids, starts, ends, lines, constants
+
+
+MIN_WORKERS = 3
+"""
+fewer processes than this and its quicker to lex it all here. Timing an
+8MB file: splitting it up and stitching it back together takes the parent
+about a fifth of the time lexing it all in one go does, and each worker
+takes about a quarter longer than lexing its share would. Two workers
+would only just break even
+"""
+
+
+def tokenize_parallel (
+	src: str,
+	workers: int|None = None,
+	executor: Executor|None = None,
+	min_chunk = 1<<18,
+	recover = False,
+	constants: Constants|None = None,
+) -> Tokens:
+	"""
+	`tokenize(src)`, but split up at `split_points` and lexed on a process
+	pool, then stitched back together. Comes out the exact same, errors
+	included (the first chunk to fail is the first place lexing it all
+	in one go would). Its lexed here instead when it wouldnt be any
+	quicker: when theres fewer than `MIN_WORKERS` cpus to run it on (or
+	`workers`, an `executor` is taken at its word), or it doesnt split
+	into that many `min_chunk`s. `recover` and `constants` are the same
+	as for `tokenize`, the literals from every chunk end up in `constants`
+	"""
+	if constants is None:
+		constants = Constants()
+	cpus = os.cpu_count() or 1
+	workers = workers or cpus
+	if executor is None:
+		workers = min(workers, cpus)
+	parts = min(workers, len(src) // min_chunk)
+	points = split_points(src, parts) if parts >= MIN_WORKERS else []
+	if len(points) < MIN_WORKERS - 1:
+		return _lex_here(src, recover, constants)
+
+	bounds = [0, *points, len(src)]
+	chunks = [src[a:b] for a, b in zip(bounds, bounds[1:])]
+	own = executor is None
+	if own:
+		executor = ProcessPoolExecutor(len(chunks))
+	try:
+		results = executor.map(lex_chunk, chunks, bounds[:-1])
+		out = Tokens(source=src)
+		# tokens from different processes are different objects, share
+		# them again like a single tokenize would. Its only done once per
+		# different token in each chunk, not for every one
+		shared = {tk: tk for tk in (*WORD_TOKENS.values(), *OPERATORS.values()) if isinstance(tk, TokenType)}
+		lines = array('i', [0])
+
+		def stitch (table: list, ids: array, starts: array, ends: array, chunk_lines: array, chunk_constants: Constants):
+			# literals go by how theyre spelled, like in one tokenize
+			pooled = constants.merge(chunk_constants)
+			for i, tk in enumerate(table):
+				if isinstance(tk, (IdentifierToken, KeywordToken, DualWordSymbolToken, InplaceOpToken, ScriptArgumentToken, NewlineToken)):
+					table[i] = shared.setdefault(tk, tk)
+				elif isinstance(tk, (NumberLiteralToken, StringLiteralToken)):
+					table[i] = pooled.get(id(tk), tk)
+				elif isinstance(tk, (CommentToken, RegionToken)) and isinstance(tk._contents, slice):
+					tk._source = src
+			out.extend(map(table.__getitem__, ids))
+			out.starts.extend(starts)
+			out.ends.extend(ends)
+			lines.extend(chunk_lines)
+
+		done = 0
+		try:
+			for result in results:
+				stitch(*result)
+				done += 1
+		except LEX_ERRORS:
+			# everything before it lexed fine, so the chunk that failed
+			# starts where lexing it all in one go gets to. Lexing from
+			# there again, in the whole text, finds the same error and
+			# can tell what line its on, or recovers from it the same
+			starts, ends = array('i'), array('i')
+			rest_constants = Constants()
+			rest = list(scan_from(
+				src, bounds[done], False, True, 0, starts, ends,
+				recover=recover, constants=rest_constants, lines=lines,
+			))
+			stitch(*_pack(rest, starts, ends, array('i'), rest_constants))
+		out.lines = LineIndex(src, lines)
+	finally:
+		if own:
+			executor.shutdown(cancel_futures=True)
+	return out
+
+
+def _lex_here (src: str, recover: bool, constants: Constants) -> Tokens:
+	tokens = Tokens(source=src)
+	lines = array('i', [0])
+	tokens.extend(scan_from(src, 0, False, True, 0, tokens.starts, tokens.ends, recover=recover, constants=constants, lines=lines))
+	tokens.lines = LineIndex(src, lines)
+	return tokens
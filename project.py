@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import tokenizer
+from tokarray import ArrayTokens
+from tokenizer import Constants
+from tokens import ErrorToken, Tokens
+
+
+def _read_yyp (path: Path) -> dict:
+	# gms2 writes its json with trailing commas, because of course it does
+	text = path.read_text('utf8')
+	return json.loads(re.sub(r',(\s*[}\]])', r'\1', text))
+
+
+def find_gml_files (root: str|Path) -> list[Path]:
+	"""
+	Every .gml file in a GMS2 project. `root` can be the project folder or
+	its .yyp; if theres a manifest only the resources it lists are used
+	(so stale folders the IDE forgot about are skipped), otherwise the
+	whole tree is searched
+	"""
+	root = Path(root)
+	if root.is_dir():
+		yyps = sorted(root.glob('*.yyp'))
+		if len(yyps) == 0:
+			return sorted(root.rglob('*.gml'))
+		yyp = yyps[0]
+	else:
+		yyp, root = root, root.parent
+
+	files = list[Path]()
+	for res in _read_yyp(yyp).get('resources', []):
+		# {"id":{"name":"scr_x","path":"scripts/scr_x/scr_x.yy",},}
+		if (rpath:=res.get('id', {}).get('path')) is None:
+			continue
+		# scripts have one <name>.gml, objects have one per event
+		files.extend(sorted((root/rpath).parent.glob('*.gml')))
+	return files
+
+
+@dataclass
+class FileResult:
+	path: Path
+	tokens: Tokens|ArrayTokens|None
+	error: str|None
+	size: int
+	count: int
+	seconds: float
+	# (start, end, line, column, message) for every ErrorToken, when lexed
+	# with recover. Lines & columns count from 0
+	diagnostics: list[tuple[int, int, int, int, str]] = field(default_factory=list)
+	# number & string literals, and how many of them were already pooled
+	literals: int = 0
+	literal_hits: int = 0
+	saved_bytes: int = 0
+
+
+@dataclass
+class ProjectResult:
+	results: dict[Path, FileResult] = field(default_factory=dict)
+	workers: int = 1
+	seconds: float = 0.0
+
+	@property
+	def errors (self) -> dict[Path, str]:
+		return {p: r.error for p, r in self.results.items() if r.error is not None}
+
+	@property
+	def diagnostics (self) -> dict[Path, list[tuple[int, int, int, int, str]]]:
+		return {p: r.diagnostics for p, r in self.results.items() if r.diagnostics}
+
+	@property
+	def total_bytes (self):
+		return sum(r.size for r in self.results.values())
+
+	@property
+	def total_tokens (self):
+		return sum(r.count for r in self.results.values())
+
+	@property
+	def literals (self):
+		return sum(r.literals for r in self.results.values())
+
+	@property
+	def literal_hits (self):
+		return sum(r.literal_hits for r in self.results.values())
+
+	@property
+	def cpu_seconds (self):
+		"""time spent actually tokenizing, summed over every worker"""
+		return sum(r.seconds for r in self.results.values())
+
+	def throughput (self) -> dict[str, float]:
+		wall = self.seconds or float('inf')
+		return {
+			'files': len(self.results),
+			'errors': len(self.errors),
+			'diagnostics': sum(map(len, self.diagnostics.values())),
+			'workers': self.workers,
+			'seconds': self.seconds,
+			'cpu_seconds': self.cpu_seconds,
+			'files_per_sec': len(self.results) / wall,
+			'bytes_per_sec': self.total_bytes / wall,
+			'tokens_per_sec': self.total_tokens / wall,
+			'literal_hit_rate': self.literal_hits / self.literals if self.literals else 0.0,
+			'literal_bytes_saved': sum(r.saved_bytes for r in self.results.values()),
+			# how close to linear scaling this run got
+			'speedup': self.cpu_seconds / wall,
+		}
+
+
+def tokenize_file (
+	path: Path, fast=True, keep_tokens=True, compact=False, recover=False, constants: Constants|None=None,
+) -> FileResult:
+	"""`constants` can be shared between files, so theyre all pooled together"""
+	t = time.perf_counter()
+	size = 0
+	if constants is None:
+		constants = Constants()
+	lookups, hits, saved = constants.lookups, constants.hits, constants.saved_bytes
+	try:
+		size = path.stat().st_size
+		tokens = tokenizer.main(path, fast=fast, compact=compact, recover=recover, constants=constants)
+	except Exception as e:
+		# lex errors have where they happened in a note, see tokenizer.locate_error
+		error = ' '.join((f'{type(e).__name__}: {e}', *getattr(e, '__notes__', ())))
+		return FileResult(path, None, error, size, 0, time.perf_counter() - t)
+	diagnostics = []
+	if recover:
+		diagnostics = [
+			(*tokens.span(i), *tokens.line_col(i), tk.message)
+			for i, tk in enumerate(tokens) if isinstance(tk, ErrorToken)
+		]
+	return FileResult(
+		path, tokens if keep_tokens else None, None, size, len(tokens), time.perf_counter() - t, diagnostics,
+		constants.lookups - lookups, constants.hits - hits, max(0, constants.saved_bytes - saved),
+	)
+
+
+_worker_constants: Constants|None = None
+"""the pool every file lexed on a worker process shares"""
+
+
+def _start_worker ():
+	global _worker_constants
+	_worker_constants = Constants()
+
+
+def _tokenize_file_star (args):
+	return tokenize_file(*args, constants=_worker_constants)
+
+
+def tokenize_project (
+	root: str|Path,
+	workers: int|None = None,
+	fast=True,
+	keep_tokens=True,
+	compact=False,
+	recover=False,
+) -> ProjectResult:
+	"""
+	Tokenizes every file `find_gml_files` finds on a process pool.
+	A file that fails to tokenize doesnt stop the rest, its error ends up
+	in `ProjectResult.errors`. `keep_tokens=False` only sends the counts
+	back from the workers, which is a lot cheaper if all you want is to
+	check a project lexes, and `compact=True` keeps them as
+	`tokarray.ArrayTokens`, which are a lot smaller to hold on to.
+	`recover=True` lexes past errors (see `tokenizer.tokenize`) and
+	collects every one in `ProjectResult.diagnostics` in the one go.
+	Literals are pooled across all the files a process lexes (see
+	`tokenizer.Constants`), `throughput` says how well that went
+	"""
+	files = find_gml_files(root)
+	workers = workers or os.cpu_count() or 1
+	out = ProjectResult(workers=workers)
+	jobs = [(p, fast, keep_tokens, compact, recover) for p in files]
+
+	t = time.perf_counter()
+	if workers == 1:
+		constants = Constants()
+		for job in jobs:
+			r = tokenize_file(*job, constants=constants)
+			out.results[r.path] = r
+	else:
+		# big chunks keep the pickling overhead down, small enough that
+		# one huge script doesnt leave everyone else idle at the end
+		chunksize = max(1, len(jobs) // (workers * 8))
+		with ProcessPoolExecutor(workers, initializer=_start_worker) as pool:
+			for r in pool.map(_tokenize_file_star, jobs, chunksize=chunksize):
+				out.results[r.path] = r
+	out.seconds = time.perf_counter() - t
+	return out
+
+
+if __name__ == '__main__':
+	result = tokenize_project(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None, keep_tokens=False, recover=True)
+	for path, error in result.errors.items():
+		print(f'{path}: {error}')
+	for path, found in result.diagnostics.items():
+		for start, end, line, col, message in found:
+			print(f'{path}:{line+1}:{col+1}: {message}')
+	for k, v in result.throughput().items():
+		print(f'{k:>19}: {v:,.2f}' if isinstance(v, float) else f'{k:>19}: {v}')
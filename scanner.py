@@ -0,0 +1,377 @@
+import mmap
+import re
+from array import array
+from collections.abc import Iterator, MutableSequence
+from pathlib import Path
+from time import perf_counter
+
+import mth
+from instrument import LexStats, Trace
+from strreader import StringReader
+from tokenizer import (
+	ParseError,
+	read_multiline_comment, read_hex_number, handle_number,
+	handle_string, handle_string_template, handle_directive,
+	word_token, Symbols, Constants, NEWLINE_RUN, REGION_LINE, LEX_ERRORS, resync, locate_error,
+)
+from tokens import *
+
+# Table driven version of `tokenizer.tokenize`. The master regex eats
+# whitespace, runs of newlines, words, plain decimal numbers, line comments and
+# all of the punctuation (`tokens.OPERATORS`) in one match each, anything that needs more
+# thought than that (strings, block comments, directives, weird numbers)
+# gets handed off to the same handlers the per-character lexer uses, so
+# both produce the exact same Tokens.
+
+_RULES = (
+	r'(?P<word>[A-Za-z_][A-Za-z0-9_]*)',
+	# 0x and 0b go through handle_number
+	r'(?P<num>(?:[1-9]|0(?![xXbB]))[0-9_]*(?:\.[0-9_]*)?)',
+	r'//(?P<comment>[^\n]*)\n?',
+	r'(?P<special>/\*|\.(?![^0-9])|[0-9"@$#\\])',
+	# longest first so its always maximal munch
+	'(?P<op>' + '|'.join(map(re.escape, sorted(OPERATORS, key=len, reverse=True))) + ')',
+)
+
+_WS = f'[{re.escape(mth.kinda_gml_whitespace)}]'
+
+MASTER = re.compile('|'.join((
+	f'(?P<ws>{_WS}+)',
+	f'(?P<nl>{NEWLINE_RUN.pattern})',
+	*_RULES,
+)))
+
+# for skip_trivia, newlines, line comments and whole #region lines are
+# just more whitespace
+MASTER_NO_TRIVIA = re.compile('|'.join((
+	f'(?P<ws>(?:{_WS}|\\r?\\n|//[^\\n]*\\n?|{REGION_LINE.pattern})+)',
+	*_RULES,
+)))
+
+# Everything but whitespace is ascii, so for utf8 bytes its the same
+# regex, just with the non ascii whitespace spelled out byte by byte
+_ASCII_WS = ''.join(ch for ch in mth.kinda_gml_whitespace if ch.isascii())
+_WS_BYTES = b'(?:[' + re.escape(_ASCII_WS.encode()) + b']|' + b'|'.join(
+	re.escape(ch.encode('utf8')) for ch in mth.kinda_gml_whitespace if not ch.isascii()
+) + b')'
+MASTER_BYTES = re.compile(b'|'.join((
+	b'(?P<ws>' + _WS_BYTES + b'+)',
+	b'(?P<nl>\\r?\\n(?:' + _WS_BYTES + b'*+\\r?\\n)*+)',
+	*(rule.encode() for rule in _RULES),
+)))
+
+# whats left could still turn out to be more of a newline run
+_WS_TAIL = re.compile(f'{_WS}*\\r?\\Z')
+OPERATORS_BYTES = {op.encode(): tk for op, tk in OPERATORS.items()}
+
+
+def handle_special (
+	f: StringReader, ch: str, begin: int, handle_whack_as_newline: bool, constants: Constants|None=None,
+) -> TokenType | TK:
+	"""
+	the cases from `tokenize` that dont fit in a regex. `f` is
+	positioned just past `ch`, same as it would be there
+	"""
+	match ch:
+		case '/':
+			f.skip() # *
+			start = f.tell()
+			read_multiline_comment(f)
+			return CommentToken(slice(start, f.tell()-2), True, f.text)
+		case '.':
+			f.rewind()
+			return handle_number(f, constants)
+		case '"':
+			return handle_string(f, False, constants)
+		case '@':
+			if f.vore('"'):
+				return handle_string(f, True, constants)
+			raise ParseError('Unexpected @ in stream!')
+		case '$':
+			if f.vore('"'):
+				return handle_string_template(f, constants)
+			elif mth.is_allowed_number_hex(f.peek()):
+				return read_hex_number(f, constants)
+			raise ParseError('Unexpected midas hotkey in $tream!')
+		case '#':
+			return handle_directive(f, begin, constants)
+		case '\\':
+			if not handle_whack_as_newline:
+				raise ParseError('Unexpected backslash in stream!')
+			if f.vore_newline():
+				return newline_run(1)
+			raise ParseError('Expected newline after backslash continuator!')
+		case _:
+			f.rewind()
+			return handle_number(f, constants)
+
+
+def scan_from (
+	src: str, pos=0, handle_whack_as_newline=False, final=True, base=0,
+	starts: MutableSequence[int]|None=None, ends: MutableSequence[int]|None=None,
+	symbols: Symbols|None=None, skip_trivia=False, recover=False, constants: Constants|None=None,
+	lines: MutableSequence[int]|None=None,
+):
+	"""
+	generator version of `scan`, starting at `pos`. When `final` is False
+	`src` is only part of the text, so anything that runs into the end of
+	it (and might come out different with more text) isnt yielded. The
+	offset it stopped at is the generators return value. `base` is where
+	`src` starts in the whole text, for error messages. If `starts` and
+	`ends` are given each tokens offsets get appended to them before its
+	yielded. Pass the same `symbols` to calls lexing the same text to
+	share identifiers between them, same goes for `constants` and
+	literals. `skip_trivia` and `recover` are the same as for `tokenize`.
+	If `lines` is given where each line starts gets appended to it as the
+	newlines are lexed, for a `LineIndex`
+	"""
+	match_at = (MASTER_NO_TRIVIA if skip_trivia else MASTER).match
+	if symbols is None:
+		symbols = Symbols()
+	if constants is None:
+		constants = Constants()
+	number = constants.number
+	f = None
+	end = len(src)
+	while pos < end:
+		try:
+			m = match_at(src, pos)
+			if m is None:
+				if not final and pos + 1 >= end:
+					return pos # might be half of a \r\n
+				raise ParseError(f'Unexpected character in stream "{repr(src[pos])}"')
+			nxt = m.end()
+			if not final and nxt >= end:
+				return pos
+			kind = m.lastgroup
+			if kind == 'ws':
+				# newlines, comments & regions too when skipping trivia
+				if skip_trivia and lines is not None:
+					note_lines(src, pos, nxt, lines)
+				pos = nxt
+				continue
+			elif kind == 'word':
+				tk = symbols[m.group()]
+			elif kind == 'op':
+				tk = OPERATORS[m.group()]
+			elif kind == 'nl':
+				if not final and _WS_TAIL.match(src, nxt):
+					return pos
+				tk = newline_run(m.group().count('\n'))
+				if lines is not None:
+					if tk.count == 1:
+						lines.append(nxt)
+					else:
+						note_lines(src, pos, nxt, lines)
+			elif kind == 'num':
+				tk = number(m.group())
+			elif kind == 'comment':
+				tk = CommentToken(slice(*m.span(kind)), False, src)
+				# and its newline
+				if lines is not None and nxt > m.end(kind):
+					lines.append(nxt)
+			else:
+				if f is None:
+					f = StringReader(src)
+				f.goto(pos + 1)
+				try:
+					tk = handle_special(f, m.group()[0], base + pos, handle_whack_as_newline, constants)
+				except Exception:
+					# an unclosed string or comment is only an error if
+					# theres no more text coming, and a \ continuation
+					# might have only got the \r of its \r\n so far
+					if not final and f.tell() >= end - 1:
+						return pos
+					raise
+				# regions skip their newline even if theres not one
+				nxt = min(f.tell(), end)
+				if not final and nxt >= end:
+					return pos
+				if lines is not None:
+					note_lines(src, pos, nxt, lines)
+				# block comments & \ newlines, the rest never get here
+				if skip_trivia and isinstance(tk, (NewlineToken, CommentToken)):
+					pos = nxt
+					continue
+			if starts is not None:
+				starts.append(pos)
+				ends.append(nxt)
+			yield tk
+			pos = nxt
+		except LEX_ERRORS as e:
+			if not recover:
+				# lines can only be counted if `src` starts where the text does
+				if base == 0:
+					locate_error(e, src, pos, lines)
+				raise
+			# the master regex didnt match, or a handler gave up
+			nxt = resync(src, pos, pos + 1 if m is None else f.tell())
+			if lines is not None:
+				note_lines(src, pos, nxt, lines)
+			tk = ErrorToken(str(e))
+			if starts is not None:
+				starts.append(pos)
+				ends.append(nxt)
+			yield tk
+			pos = nxt
+	return pos
+
+
+def scan (
+	src: str, handle_whack_as_newline=False, trace: Trace|None=None, stats: LexStats|None=None,
+	symbols: Symbols|None=None, skip_trivia=False, recover=False, constants: Constants|None=None,
+) -> Tokens:
+	tokens = Tokens(source=src)
+	lines = array('i', [0])
+	found = scan_from(
+		src, 0, handle_whack_as_newline, starts=tokens.starts, ends=tokens.ends,
+		symbols=symbols, skip_trivia=skip_trivia, recover=recover, constants=constants, lines=lines,
+	)
+	if trace is None and stats is None:
+		tokens.extend(found)
+	else:
+		tokens.extend(_instrumented(found, tokens, trace, stats))
+	tokens.lines = LineIndex(src, lines)
+	return tokens
+
+
+def _special_bytes (
+	buf: bytes, pos: int, handle_whack_as_newline: bool, window=256, constants: Constants|None=None,
+) -> tuple[TokenType | TK, int]:
+	"""
+	lexes the token at `pos` that needs `handle_special`, by decoding just
+	enough of `buf` after it to run `scan_from` on. Returns the token and
+	the byte offset it ends at
+	"""
+	size = len(buf)
+	while True:
+		end = min(pos + window, size)
+		# dont cut a utf8 sequence in half
+		while end < size and buf[end] & 0xC0 == 0x80:
+			end -= 1
+		text = buf[pos:end].decode('utf8')
+		ends = array('i')
+		for tk in scan_from(text, 0, handle_whack_as_newline, end >= size, pos, array('i'), ends, constants=constants):
+			break
+		else:
+			# ran into the end of the window
+			window *= 8
+			continue
+		break
+
+	if text.isascii():
+		to_bytes = lambda i: pos + min(i, len(text))
+	else:
+		to_bytes = lambda i: pos + len(text[:i].encode('utf8'))
+	# comments & regions point into `text`, point them at `buf` instead
+	if isinstance(tk, (CommentToken, RegionToken)) and isinstance(tk._contents, slice):
+		tk._contents = slice(to_bytes(tk._contents.start), to_bytes(tk._contents.stop))
+		tk._source = buf
+	return tk, to_bytes(ends[0])
+
+
+def scan_bytes_from (
+	buf: bytes, pos=0, handle_whack_as_newline=False,
+	starts: MutableSequence[int]|None=None, ends: MutableSequence[int]|None=None,
+	lines: MutableSequence[int]|None=None,
+):
+	"""
+	`scan_from`, but lexing utf8 bytes (or anything else re can match,
+	like an mmap) as is. Offsets are byte offsets, and nothing is decoded
+	apart from words, string literals and the like as theyre found;
+	comments are only decoded if their `contents` is used. `lines` is the
+	same as for `scan_from`, the columns are in bytes
+	"""
+	match_at = MASTER_BYTES.match
+	# same as `Symbols`, keyed on the bytes so theyre only decoded once
+	words = dict[bytes, TokenType | TK]()
+	constants = Constants()
+	end = len(buf)
+	while pos < end:
+		m = match_at(buf, pos)
+		if m is None:
+			ch = buf[pos:pos+4].decode('utf8', 'replace')[0]
+			e = ParseError(f'Unexpected character in stream "{repr(ch)}"')
+			locate_error(e, buf, pos, lines)
+			raise e
+		nxt = m.end()
+		kind = m.lastgroup
+		if kind == 'ws':
+			pos = nxt
+			continue
+		elif kind == 'word':
+			if (tk:=words.get(word:=m.group())) is None:
+				tk = words[word] = word_token(word.decode('ascii'))
+		elif kind == 'op':
+			tk = OPERATORS_BYTES[m.group()]
+		elif kind == 'nl':
+			tk = newline_run(m.group().count(b'\n'))
+			if lines is not None:
+				if tk.count == 1:
+					lines.append(nxt)
+				else:
+					note_lines(buf, pos, nxt, lines, b'\n')
+		elif kind == 'num':
+			tk = constants.number(m.group().decode('ascii'))
+		elif kind == 'comment':
+			tk = CommentToken(slice(*m.span(kind)), False, buf)
+			if lines is not None and nxt > m.end(kind):
+				lines.append(nxt)
+		else:
+			try:
+				tk, nxt = _special_bytes(buf, pos, handle_whack_as_newline, constants=constants)
+			except LEX_ERRORS as e:
+				# its lexed in a window starting at `pos`, scan_from can only
+				# tell where it is when thats the start of the text
+				if pos > 0:
+					locate_error(e, buf, pos, lines)
+				raise
+			if lines is not None:
+				note_lines(buf, pos, nxt, lines, b'\n')
+		if starts is not None:
+			starts.append(pos)
+			ends.append(nxt)
+		yield tk
+		pos = nxt
+	return pos
+
+
+def scan_bytes (buf: bytes, handle_whack_as_newline=False, trace: Trace|None=None, stats: LexStats|None=None) -> Tokens:
+	tokens = Tokens(source=buf)
+	lines = array('i', [0])
+	found = scan_bytes_from(buf, 0, handle_whack_as_newline, starts=tokens.starts, ends=tokens.ends, lines=lines)
+	if trace is None and stats is None:
+		tokens.extend(found)
+	else:
+		tokens.extend(_instrumented(found, tokens, trace, stats))
+	tokens.lines = LineIndex(buf, lines)
+	return tokens
+
+
+def scan_file (path: str|Path, handle_whack_as_newline=False, trace: Trace|None=None, stats: LexStats|None=None) -> Tokens:
+	"""
+	`scan_bytes` on an mmap of the file, so its never read in & decoded as
+	a whole. The map stays open as long as the tokens (`Tokens.source`) do
+	"""
+	with open(path, 'rb') as fp:
+		try:
+			buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			# empty files cant be mapped
+			buf = b''
+	return scan_bytes(buf, handle_whack_as_newline, trace, stats)
+
+
+def _instrumented (found: Iterator[TokenType | TK], tokens: Tokens, trace: Trace|None, stats: LexStats|None):
+	mark = started = perf_counter()
+	for tk in found:
+		# scan_from has already put the span in
+		if trace is not None:
+			trace(tk, slice(tokens.starts[-1], tokens.ends[-1]), ())
+		if stats is not None:
+			t = perf_counter()
+			stats.record(tk, t - mark)
+			mark = t
+		yield tk
+	if stats is not None:
+		stats.finish(len(tokens.source), perf_counter() - started)
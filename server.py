@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+
+import tokenizer
+from instrument import kind_name
+from tokens import *
+
+# JSON lines in, JSON lines out. Requests:
+#
+#	{"id": 1, "op": "tokenize", "path": "scripts/x/x.gml"}
+#	{"id": 2, "op": "tokenize", "text": "x = 1;", "fast": false, "batch": 500}
+#	{"id": 3, "op": "stats"}
+#
+# A tokenize answers with as many {"id", "tokens": [...]} lines as it takes,
+# `batch` tokens each, then {"id", "done": true, "count", "seconds"}. Tokens
+# are [kind, start, end] with the value on the end for ones that have one,
+# which is a list for the ones that carry more than one thing:
+#
+#	CommentToken         [contents, multiline]
+#	RegionToken          [is_end, contents]
+#	MacroToken           [name, configuration, source]
+#	StringTemplateToken  [string, sources]
+#
+# Anything that goes wrong is {"id", "error": "..."} instead.
+
+
+def encode_token (tk: TokenType | TK, start: int, end: int) -> list:
+	match tk:
+		case IdentifierToken():
+			value = tk.name
+		case KeywordToken():
+			value = tk.keyword
+		case NumberLiteralToken():
+			value = tk.value
+		case StringLiteralToken():
+			value = tk.string
+		case StringTemplateToken():
+			value = [tk.string, tk.sources]
+		case ScriptArgumentToken():
+			value = tk.index
+		case NewlineToken():
+			value = tk.count
+		case InplaceOpToken():
+			value = tk.kind.value
+		case DualWordSymbolToken():
+			value = tk.was_word
+		case CommentToken():
+			value = [tk.contents, tk.multiline]
+		case RegionToken():
+			value = [tk.is_end, tk.contents]
+		case MacroToken():
+			value = [tk.name, tk.configuration, tk.source]
+		case _:
+			return [kind_name(tk), start, end]
+	return [kind_name(tk), start, end, value]
+
+
+def tokenize_job (path: str|None, text: str|None, fast: bool) -> list[list]:
+	"""runs on the pool, so it hands back plain lists (much cheaper to pickle)"""
+	if text is None:
+		text = Path(path).read_text('utf8')
+	tokens = tokenizer.tokenize(text, fast=fast)
+	return list(map(encode_token, tokens, tokens.starts, tokens.ends))
+
+
+def _percentile (ordered: list[float], p: float) -> float:
+	if len(ordered) == 0:
+		return 0.0
+	return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class TokenServer:
+	"""
+	Keeps a process pool of tokenizers warm, so tools dont pay for a fresh
+	interpreter every time. Requests for the same version of the same file
+	(or the same text) that come in while one is already being tokenized
+	wait on that one instead of doing it again
+	"""
+	def __init__ (self, workers: int|None=None, executor: Executor|None=None, batch=1000):
+		self.executor = executor or ProcessPoolExecutor(workers or os.cpu_count() or 1)
+		self.batch = batch
+		# version key -> the job tokenizing it
+		self._in_flight = dict[tuple, asyncio.Future]()
+		self.latencies = deque[float](maxlen=4096)
+		self.requests = 0
+		# requests waiting on a job, coalesced ones included
+		self.waiting = 0
+		self.coalesced = 0
+		self.errors = 0
+
+	@staticmethod
+	def version_key (path: str|None, text: str|None, fast: bool) -> tuple:
+		if text is not None:
+			return 'text', hashlib.sha256(text.encode('utf8', 'surrogatepass')).digest(), fast
+		st = os.stat(path)
+		return 'path', os.path.realpath(path), st.st_mtime_ns, st.st_size, fast
+
+	async def tokenize (self, path: str|None, text: str|None, fast=True) -> list[list]:
+		key = self.version_key(path, text, fast)
+		if (job:=self._in_flight.get(key)) is not None:
+			self.coalesced += 1
+		else:
+			loop = asyncio.get_running_loop()
+			job = self._in_flight[key] = loop.run_in_executor(self.executor, tokenize_job, path, text, fast)
+			job.add_done_callback(lambda _: self._in_flight.pop(key, None))
+		# shield it, one client going away shouldnt cancel it for the rest
+		self.waiting += 1
+		try:
+			return await asyncio.shield(job)
+		finally:
+			self.waiting -= 1
+
+	def stats (self) -> dict:
+		ordered = sorted(self.latencies)
+		return {
+			'requests': self.requests,
+			'coalesced': self.coalesced,
+			'errors': self.errors,
+			'queue_depth': self.waiting,
+			'in_flight_jobs': len(self._in_flight),
+			'latency_ms': {
+				f'p{int(p*100)}': _percentile(ordered, p) * 1000
+				for p in (0.5, 0.9, 0.99)
+			},
+		}
+
+	async def handle (self, request: dict, send):
+		"""answers one request, `send` writes one response line"""
+		rid = request.get('id')
+		op = request.get('op', 'tokenize')
+		if op == 'stats':
+			await send({'id': rid, 'stats': self.stats()})
+			return
+		elif op != 'tokenize':
+			await send({'id': rid, 'error': f'Unknown op "{op}"'})
+			return
+
+		self.requests += 1
+		t = time.perf_counter()
+		path, text = request.get('path'), request.get('text')
+		fast, batch = request.get('fast', True), request.get('batch', self.batch)
+		try:
+			if (path is None) == (text is None):
+				raise ValueError('Give one of "path" or "text"')
+			if not isinstance(path if text is None else text, str):
+				raise TypeError(f'"{'text' if path is None else 'path'}" has to be a string')
+			if not isinstance(fast, bool):
+				raise TypeError('"fast" has to be true or false')
+			# bools are ints too
+			if type(batch) is not int or batch < 1:
+				raise ValueError('"batch" has to be a whole number above 0')
+			tokens = await self.tokenize(path, text, fast)
+		except Exception as e:
+			self.errors += 1
+			try:
+				await send({'id': rid, 'error': f'{type(e).__name__}: {e}'})
+			except ConnectionError:
+				pass
+			return
+		try:
+			for i in range(0, len(tokens), batch):
+				await send({'id': rid, 'tokens': tokens[i:i+batch]})
+			seconds = time.perf_counter() - t
+			self.latencies.append(seconds)
+			await send({'id': rid, 'done': True, 'count': len(tokens), 'seconds': seconds})
+		except ConnectionError:
+			# the client went away, theres no one to tell
+			self.errors += 1
+
+	async def serve_stream (self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		"""
+		one connection. Requests are handled concurrently, so responses to
+		different ids can be interleaved; each line is one whole response
+		"""
+		async def send (response: dict):
+			writer.write(json.dumps(response).encode() + b'\n')
+			await writer.drain()
+
+		pending = set[asyncio.Task]()
+		while line:=await reader.readline():
+			if not line.strip():
+				continue
+			try:
+				request = json.loads(line)
+				if not isinstance(request, dict):
+					raise ValueError('Request isnt an object')
+			except ValueError as e:
+				await send({'id': None, 'error': f'Bad request: {e}'})
+				continue
+			task = asyncio.create_task(self.handle(request, send))
+			pending.add(task)
+			task.add_done_callback(pending.discard)
+		if pending:
+			await asyncio.wait(pending)
+		writer.close()
+
+	def close (self):
+		self.executor.shutdown(cancel_futures=True)
+
+
+async def serve_stdio (server: TokenServer):
+	loop = asyncio.get_running_loop()
+	reader = asyncio.StreamReader()
+	await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+	transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+	writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+	await server.serve_stream(reader, writer)
+
+
+async def serve_unix (server: TokenServer, path: str|Path):
+	unix = await asyncio.start_unix_server(server.serve_stream, path)
+	async with unix:
+		await unix.serve_forever()
+
+
+def main (argv=None):
+	ap = argparse.ArgumentParser(prog='python server.py', description='tokenize GML over JSON lines')
+	ap.add_argument('--socket', type=Path, help='listen on this unix socket instead of stdio')
+	ap.add_argument('--workers', type=int, help='tokenizer processes, default is one per cpu')
+	ap.add_argument('--batch', type=int, default=1000, help='tokens per response line')
+	args = ap.parse_args(argv)
+
+	server = TokenServer(args.workers, batch=args.batch)
+	try:
+		if args.socket is not None:
+			asyncio.run(serve_unix(server, args.socket))
+		else:
+			asyncio.run(serve_stdio(server))
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.close()
+
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
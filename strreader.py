@@ -1,6 +1,9 @@
 from typing import Callable, TypeAlias
+import re
 import string
 
+import mth
+
 Predicate: TypeAlias = Callable[[str], bool]
 
 class StringReader:
@@ -19,9 +22,9 @@ class StringReader:
 		return self._ptr
 
 	def peek (self, offset=0):
-		if (self._ptr + offset) >= len(self):
+		if (at:=self._ptr + offset) >= len(self):
 			return ''
-		return self._txt[self._ptr]
+		return self._txt[at]
 
 	def read (self):
 		ch = self.peek()
@@ -48,6 +51,9 @@ class StringReader:
 	def seek (self, offset: int):
 		self._ptr += offset
 
+	def goto (self, index: int):
+		self._ptr = index
+
 	def skip_while (self, predicate: Predicate):
 		while True:
 			if self.can_read() and predicate(self.peek()):
@@ -65,18 +71,46 @@ class StringReader:
 			return True
 		return False
 
-	def take_while (self, predicate: Predicate, xtra_skip=0) -> str:
-		start = self.tell()
-		while predicate(self.peek()) and self.can_read():
-			self.skip()
-		v = self.text[start : self.tell()]
-		if xtra_skip != 0:
-			self.skip(xtra_skip)
-		return v
+	# a whole run of one character class at once, instead of a predicate
+	# call (and a peek, and a skip) per character. The runs are in mth
+
+	def take_run (self, run: re.Pattern) -> str:
+		if (m:=run.match(self._txt, self._ptr)) is None:
+			return ''
+		self._ptr = m.end()
+		return m.group()
+
+	def skip_run (self, run: re.Pattern):
+		if (m:=run.match(self._txt, self._ptr)) is not None:
+			self._ptr = m.end()
+
+	def take_identifier (self) -> str:
+		return self.take_run(mth.identifier_run)
+
+	def take_hex (self) -> str:
+		"""hex digits and _"""
+		return self.take_run(mth.number_hex_run)
+
+	def skip_digits (self):
+		"""decimal digits and _"""
+		self.skip_run(mth.number_lit_run)
+
+	def skip_gml_whitespace (self):
+		"""unlike `skip_whitespace`, stops at newlines"""
+		self.skip_run(mth.whitespace_run)
+
+	def rest_of_line (self) -> slice:
+		"""where the rest of the line is, the reader ends up past its newline"""
+		start = self._ptr
+		if (end:=self._txt.find('\n', start)) < 0:
+			end = len(self._txt)
+		self._ptr = end + 1
+		return slice(start, end)
 
 	def vore (self, *whats: str):
 		for what in whats:
-			if self.peek() not in what:
+			# '' is in every string, dont let the end of the text match
+			if (ch:=self.peek()) == '' or ch not in what:
 				return False
 			self.skip()
 		return True
@@ -109,13 +143,3 @@ class StringReader:
 			self.skip()
 			return True
 		return False
-
-	# no seriously, fuck windows
-	def vore_pev_newline (self):
-		if self.prev() == '\n':
-			return True
-		elif self.prev() == '\r' and self.peek() == '\n':
-			self.skip()
-			return True
-		return False
-
@@ -0,0 +1,36 @@
+import unittest
+
+import tokenizer
+from tokens import *
+
+
+class LazyBodies(unittest.TestCase):
+	"""macro bodies & template blocks are only lexed when theyre used"""
+
+	def test_macro_body_error_surfaces_on_body (self):
+		tokens = tokenizer.tokenize('#macro M 1 ` 2\n', recover=True)
+		macro = tokens[0]
+		self.assertIsInstance(macro, MacroToken)
+		self.assertEqual(tokens.diagnostics(), [])
+		with self.assertRaises(tokenizer.LEX_ERRORS):
+			macro.body
+		# printing it still works, it shows the body as written
+		self.assertIn("'1 ` 2'", str(macro))
+
+	def test_template_body_error_surfaces_on_bodies (self):
+		tokens = tokenizer.tokenize('x = $"a{b `}c";\n', recover=True)
+		template = tokens[2]
+		self.assertIsInstance(template, StringTemplateToken)
+		self.assertEqual(tokens.diagnostics(), [])
+		with self.assertRaises(tokenizer.LEX_ERRORS):
+			template.bodies
+		self.assertIn("{'b `'}", str(template))
+
+	def test_good_bodies_are_lexed (self):
+		macro = tokenizer.tokenize('#macro M 1 + 2\n')[0]
+		self.assertEqual(len(macro.body), 3)
+		self.assertEqual(str(macro), '< #macro M, (< Val: 1 >, TK.PLUS, < Val: 2 >) >')
+
+
+if __name__ == '__main__':
+	unittest.main()
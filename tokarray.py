@@ -0,0 +1,223 @@
+from array import array
+from collections.abc import Iterable, Sequence
+from operator import add, sub
+
+from scanner import scan_from
+from tokenizer import Constants
+from tokens import *
+
+# Kind codes. every TK member gets its own, after that one per token
+# class that can be packed into a single int payload. Anything else
+# (comments, regions, macros, templates...) is kept as is in a side table.
+_TK = list(TK)
+_TK_CODE = {tk: i for i, tk in enumerate(_TK)}
+_INPLACE = list(InplaceKind)
+
+(
+	K_LBRACE, K_RBRACE, K_AND, K_OR, K_XOR, K_NOT,
+	K_INPLACE, K_ARGUMENT, K_IDENT, K_KEYWORD, K_NUMBER, K_STRING, K_OBJECT,
+	K_NEWLINE,
+) = range(len(_TK), len(_TK) + 14)
+
+_DUAL_WORD = {
+	LBraceToken: K_LBRACE,
+	RBraceToken: K_RBRACE,
+	AndToken: K_AND,
+	OrToken: K_OR,
+	XorToken: K_XOR,
+	LogicNotToken: K_NOT,
+}
+_DUAL_WORD_CLASS = {v: k for k, v in _DUAL_WORD.items()}
+
+
+class ArrayTokens(Sequence):
+	"""
+	`Tokens`, but stored as parallel arrays (kind code, start offset,
+	length, payload) instead of one python object per token. Identifier
+	names and literal values go in side tables, deduplicated, and the
+	token objects are only made when theyre indexed. Pickles compactly too,
+	which is nice for sending whole projects between processes
+	"""
+	def __init__ (self, tokens: Iterable[TokenType | TK] = (), source: str|None=None):
+		self.source = source
+		self.kinds = array('B')
+		self.starts = array('i')
+		self.lengths = array('i')
+		self.payloads = array('i')
+		self.names = list[str]()
+		self.values = list()
+		self.objects = list()
+		self._name_ids = dict[str, int]()
+		self._value_ids = dict()
+		for tk in tokens:
+			self.append(tk)
+
+	@classmethod
+	def from_source (cls, src: str, handle_whack_as_newline=False, recover=False, constants: Constants|None=None):
+		out = cls(source=src)
+		ends = array('i')
+		lines = array('i', [0])
+		encode = out._encode
+		kinds, payloads = out.kinds, out.payloads
+		for tk in scan_from(src, 0, handle_whack_as_newline, starts=out.starts, ends=ends, recover=recover, constants=constants, lines=lines):
+			kind, payload = encode(tk)
+			kinds.append(kind)
+			payloads.append(payload)
+		out.lengths = array('i', map(sub, ends, out.starts))
+		out.lines = LineIndex(src, lines)
+		return out
+
+	def _name (self, name: str):
+		if (i:=self._name_ids.get(name)) is None:
+			i = self._name_ids[name] = len(self.names)
+			self.names.append(name)
+		return i
+
+	def _value (self, value):
+		# 1, 1.0 and True all hash the same, keep them apart
+		key = (type(value), value)
+		if (i:=self._value_ids.get(key)) is None:
+			i = self._value_ids[key] = len(self.values)
+			self.values.append(value)
+		return i
+
+	def _object (self, tk):
+		self.objects.append(tk)
+		return len(self.objects) - 1
+
+	def _encode (self, tk: TokenType | TK) -> tuple[int, int]:
+		match tk:
+			case TK():
+				return _TK_CODE[tk], 0
+			case IdentifierToken():
+				return K_IDENT, self._name(tk.name)
+			case NumberLiteralToken():
+				return K_NUMBER, self._value(tk.value)
+			case StringLiteralToken():
+				return K_STRING, self._value(tk.string)
+			case DualWordSymbolToken() if type(tk) in _DUAL_WORD:
+				return _DUAL_WORD[type(tk)], tk.was_word
+			case InplaceOpToken():
+				return K_INPLACE, _INPLACE.index(tk.kind)
+			case ScriptArgumentToken():
+				return K_ARGUMENT, tk.index
+			case NewlineToken():
+				return K_NEWLINE, tk.count
+			case KeywordToken():
+				return K_KEYWORD, self._name(tk.keyword)
+		return K_OBJECT, self._object(tk)
+
+	def append (self, tk: TokenType | TK, start=-1, end=-1):
+		kind, payload = self._encode(tk)
+		self.kinds.append(kind)
+		self.starts.append(start)
+		self.lengths.append(end - start if start >= 0 else 0)
+		self.payloads.append(payload)
+
+	def __iadd__ (self, other):
+		if isinstance(other, (TokenType, TK)):
+			self.append(other)
+		else:
+			for tk in other:
+				self.append(tk)
+		return self
+
+	def __len__ (self):
+		return len(self.kinds)
+
+	def _decode (self, kind: int, payload: int) -> TokenType | TK:
+		if kind < len(_TK):
+			return _TK[kind]
+		elif kind == K_IDENT:
+			return IdentifierToken(self.names[payload])
+		elif kind == K_NUMBER:
+			return NumberLiteralToken(self.values[payload])
+		elif kind == K_STRING:
+			return StringLiteralToken(self.values[payload])
+		elif kind == K_OBJECT:
+			return self.objects[payload]
+		elif kind == K_INPLACE:
+			return InplaceOpToken(_INPLACE[payload])
+		elif kind == K_ARGUMENT:
+			return ScriptArgumentToken(payload)
+		elif kind == K_NEWLINE:
+			return newline_run(payload)
+		elif kind == K_KEYWORD:
+			return KeywordToken(self.names[payload])
+		return _DUAL_WORD_CLASS[kind](bool(payload))
+
+	def __getitem__ (self, index):
+		if isinstance(index, slice):
+			# a `Tokens`, spans & all, so it can be used like one
+			out = Tokens(map(self._decode, self.kinds[index], self.payloads[index]), self.source)
+			out.starts = self.starts[index]
+			# -1 + 0 for the ones without a span
+			out.ends = array('i', map(add, out.starts, self.lengths[index]))
+			if (lines:=getattr(self, '_lines', None)) is not None:
+				out.lines = lines
+			return out
+		return self._decode(self.kinds[index], self.payloads[index])
+
+	def __iter__ (self):
+		return map(self._decode, self.kinds, self.payloads)
+
+	def kind (self, index: int) -> TK | type:
+		"""what `self[index]` is (a TK member or token class), without making it"""
+		kind = self.kinds[index]
+		if kind < len(_TK):
+			return _TK[kind]
+		elif kind == K_OBJECT:
+			return type(self.objects[self.payloads[index]])
+		return _KIND_CLASS.get(kind) or _DUAL_WORD_CLASS[kind]
+
+	def span (self, index: int) -> tuple[int, int] | None:
+		if (start:=self.starts[index]) < 0:
+			return None
+		return start, start + self.lengths[index]
+
+	def location (self, index: int) -> slice | None:
+		if (start:=self.starts[index]) < 0:
+			return None
+		return slice(start, start + self.lengths[index])
+
+	def text (self, index: int) -> str:
+		if self.source is None or (span:=self.span(index)) is None:
+			return ''
+		return self.source[span[0]:span[1]]
+
+	def token (self, index: int) -> Token:
+		return Token(self[index], location=self.location(index))
+
+	def diagnostics (self) -> list[tuple[slice|None, str]]:
+		"""same as for `Tokens`, only the side table gets looked at"""
+		return [
+			(self.location(i), tk.message)
+			for i, kind in enumerate(self.kinds)
+			if kind == K_OBJECT and isinstance(tk:=self.objects[self.payloads[i]], ErrorToken)
+		]
+
+	# same as for `Tokens`
+	lines = Tokens.lines
+	line_col = Tokens.line_col
+
+	def __getstate__ (self):
+		# the dedup dicts can be rebuilt from the tables
+		state = self.__dict__.copy()
+		del state['_name_ids'], state['_value_ids']
+		return state
+
+	def __setstate__ (self, state):
+		self.__dict__.update(state)
+		self._name_ids = {name: i for i, name in enumerate(self.names)}
+		self._value_ids = {(type(v), v): i for i, v in enumerate(self.values)}
+
+
+_KIND_CLASS = {
+	K_INPLACE: InplaceOpToken,
+	K_ARGUMENT: ScriptArgumentToken,
+	K_NEWLINE: NewlineToken,
+	K_IDENT: IdentifierToken,
+	K_KEYWORD: KeywordToken,
+	K_NUMBER: NumberLiteralToken,
+	K_STRING: StringLiteralToken,
+}
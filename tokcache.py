@@ -0,0 +1,129 @@
+import hashlib
+import os
+import pickle
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import tokenizer
+from tokens import *
+
+MAGIC = b'GMLTOKS\n'
+
+
+@dataclass
+class CacheStats:
+	hits: int = 0
+	misses: int = 0
+	bytes_read: int = 0
+	bytes_written: int = 0
+	evictions: int = 0
+	entries: int = 0
+	size: int = 0
+	"""bytes currently on disk"""
+
+	@property
+	def hit_rate (self):
+		total = self.hits + self.misses
+		return self.hits / total if total else 0.0
+
+
+class TokenCache:
+	"""
+	On disk cache of token streams, keyed by a hash of the source text and
+	`tokenizer.VERSION`. Since its content addressed the same script copied
+	into ten projects is only tokenized and stored once. Entries are
+	zlib'd pickles (token streams are *very* repetitive, so this shrinks
+	them by ~30x), and the least recently used ones get deleted once the
+	cache grows past `max_bytes`
+	"""
+	def __init__ (self, root: str|Path, max_bytes=256<<20):
+		self.root = Path(root)
+		self.root.mkdir(parents=True, exist_ok=True)
+		self.max_bytes = max_bytes
+		self.stats = CacheStats()
+		# key -> size on disk, oldest first
+		self._lru = OrderedDict[str, int]()
+		entries = [(p.stat(), p.stem) for p in self.root.glob('*.tok')]
+		for st, key in sorted(entries, key=lambda e: e[0].st_mtime):
+			self._lru[key] = st.st_size
+			self.stats.size += st.st_size
+		self.stats.entries = len(self._lru)
+
+	@staticmethod
+	def key (text: str) -> str:
+		h = hashlib.sha256(f'{tokenizer.VERSION}\0'.encode())
+		h.update(text.encode('utf8', 'surrogatepass'))
+		return h.hexdigest()
+
+	def _path (self, key: str):
+		return self.root/f'{key}.tok'
+
+	def get (self, text: str) -> Tokens|None:
+		key = self.key(text)
+		if key not in self._lru:
+			self.stats.misses += 1
+			return None
+		path = self._path(key)
+		try:
+			data = path.read_bytes()
+			if not data.startswith(MAGIC):
+				raise ValueError('bad cache entry')
+			tokens = pickle.loads(zlib.decompress(memoryview(data)[len(MAGIC):]))
+		except Exception:
+			# deleted from under us or corrupt, either way its a miss
+			self._forget(key)
+			self.stats.misses += 1
+			return None
+		self._lru.move_to_end(key)
+		os.utime(path)
+		self.stats.hits += 1
+		self.stats.bytes_read += len(data)
+		return tokens
+
+	def put (self, text: str, tokens: Tokens):
+		key = self.key(text)
+		data = MAGIC + zlib.compress(pickle.dumps(tokens, pickle.HIGHEST_PROTOCOL))
+		path = self._path(key)
+		# write then rename, so other processes sharing the cache
+		# never see half an entry
+		tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+		tmp.write_bytes(data)
+		os.replace(tmp, path)
+		if key in self._lru:
+			self.stats.size -= self._lru[key]
+		self._lru[key] = len(data)
+		self._lru.move_to_end(key)
+		self.stats.size += len(data)
+		self.stats.bytes_written += len(data)
+		self._evict()
+		self.stats.entries = len(self._lru)
+
+	def _forget (self, key: str):
+		if (size:=self._lru.pop(key, None)) is not None:
+			self.stats.size -= size
+		self._path(key).unlink(missing_ok=True)
+		self.stats.entries = len(self._lru)
+
+	def _evict (self):
+		while self.stats.size > self.max_bytes and len(self._lru) > 1:
+			key = next(iter(self._lru))
+			self._forget(key)
+			self.stats.evictions += 1
+
+	def clear (self):
+		for key in list(self._lru):
+			self._forget(key)
+
+	def tokenize (self, src: str, fast=True) -> Tokens:
+		if (tokens:=self.get(src)) is None:
+			tokens = tokenizer.tokenize(src, fast=fast)
+			self.put(src, tokens)
+		return tokens
+
+	def main (self, targ: str|Path, fast=True) -> Tokens:
+		"""cached `tokenizer.main`"""
+		tokens = self.tokenize(Path(targ).read_text('utf8'), fast)
+		tokens += EOF()
+		return tokens
@@ -1,10 +1,22 @@
+import re
+import sys
+from array import array
 from pathlib import Path
+from time import perf_counter
+from typing import Iterator, TextIO
 
 import mth
 from gml_keywords import gml_keywords
+from instrument import LexStats, Trace
 from strreader import StringReader
 from tokens import *
 
+VERSION = 6
+"""
+bump this whenever what `tokenize` outputs changes, anything that stores
+token streams (tokcache) keys on it
+"""
+
 
 class ParseError(Exception):
 	pass
@@ -13,49 +25,234 @@ class ParseError(Exception):
 class ParseNumberError(ParseError):
 	pass
 
-KINDA_WHITESPACE = lambda ch: ch in mth.kinda_gml_whitespace
-
-
-def read_multiline_comment (f: StringReader):
+LEX_ERRORS = (ParseError, mth.DigestStringError, ValueError)
+"""
+everything lexing bad text can raise. The ValueErrors are int() & float()
+choking on numbers without any digits, like `0x` or a `.` at the very end
+"""
+
+
+def locate_error (e: Exception, src: str|bytes, begin: int, lines: array|None=None):
+	"""
+	notes down the line & column of the token starting at `begin` that
+	`e` was raised lexing, its message stays the same. `lines` is the line
+	starts noted down lexing up to there, if there are any
+	"""
+	e.add_note(f'at line:column {LineIndex(src, lines).describe(begin)}')
+
+
+def resync (src: str, begin: int, reached: int) -> int:
+	"""
+	where to start lexing again after a token starting at `begin` failed
+	having read up to `reached`. Thats the next newline, unless it already
+	read past that (an unclosed comment or @"" string takes everything)
+	"""
+	if (nl:=src.find('\n', max(begin, reached - 1))) < 0:
+		return len(src)
+	return nl
+
+
+_COMMENT_STOPS = re.compile(r'[*/]')
+
+
+def skip_multiline_comment (src: str, pos: int) -> int:
+	"""
+	where the /* comment whose text starts at `pos` ends, just past its */.
+	Only stops on * and /, the text in between is jumped over in one go
+	"""
+	# nested multi-line comments
+	# GML doesnt suppourt them, but I Will Fuck You.
+	# here its considered an error to have an unclosed multiline
+	# comment inside another multiline comment. This is far more permissive
+	# for multicomming out other blocks of text that may or may not have multiline
+	# comments in them already.
+	# That, or i could do something stupid like have the first pass of the tokenizer
+	# do *just* comments and determine whether or not shits nested by whether it reaches
+	# the end of the file and finds the depth is still greater than 0. that would
+	# work I Guess, but damn if that isnt fucking stupid -_-
+
+	# this reads it the same as the old vore('*', '/') / vore('/', '*') /
+	# skip() loop did, which ate the * or / even when the second character
+	# didnt match. so **/ doesnt close a comment
 	depth = 0
-	while True:
-		if f.vore('*', '/'):
-			if depth > 0:
+	size = len(src)
+	search = _COMMENT_STOPS.search
+	while (m:=search(src, pos)) is not None:
+		p = m.start()
+		if src[p] == '*':
+			if src[p+1:p+2] == '/':
+				if depth == 0:
+					return p + 2
 				depth -= 1
+				pos = p + 2
 				continue
-			else:
-				return
-		# nested multi-line comments
-		# GML doesnt suppourt them, but I Will Fuck You.
-		# here its considered an error to have an unclosed multiline
-		# comment inside another multiline comment. This is far more permissive
-		# for multicomming out other blocks of text that may or may not have multiline
-		# comments in them already.
-		# That, or i could do something stupid like have the first pass of the tokenizer
-		# do *just* comments and determine whether or not shits nested by whether it reaches
-		# the end of the file and finds the depth is still greater than 0. that would
-		# work I Guess, but damn if that isnt fucking stupid -_-
-		elif f.vore('/', '*'):
-			depth += 1
-			continue
-		elif f.peek() == '':
-			raise ParseError('Unclosed multiline comment!')
-		f.skip()
-
-
-def read_hex_number (f: StringReader) -> TokenType:
-	name = f.take_while(mth.is_allowed_number_hex)
-	return NumberLiteralToken(int(name.replace('_', ''), 16))
-
-
-def read_css_colour (f: StringReader) -> TokenType:
-	name = f.take_while(mth.is_allowed_number_hex).replace('_', '')
-	if (l:=len(name)) > 6:
-		raise ParseNumberError(f'Too many digits for hex colour code #{name}!')
-	elif l < 6:
-		raise ParseNumberError(f'Not enough digits for hex colour code #{name}!')
-	value = int(name, 16)
-	return NumberLiteralToken(((value>>16)&0xFF)|(value&0x00FF00)|((value&0xFF)<<16))
+			p += 1
+		if src[p:p+1] == '/':
+			if src[p+1:p+2] == '*':
+				depth += 1
+				pos = p + 2
+				continue
+			p += 1
+		if p >= size:
+			break
+		pos = p + 1
+	raise ParseError('Unclosed multiline comment!')
+
+
+def read_multiline_comment (f: StringReader):
+	try:
+		f.goto(skip_multiline_comment(f.text, f.tell()))
+	except ParseError:
+		# leave it at the end like reading it a char at a time did, the
+		# streaming scanner checks for that to know it needs more text
+		f.goto(len(f))
+		raise
+
+
+# possessive, or re keeps a backtracking frame around for every line
+NEWLINE_RUN = re.compile(rf'\r?\n(?:[{re.escape(mth.kinda_gml_whitespace)}]*+\r?\n)*+')
+"""newlines in a row, with nothing but whitespace between them"""
+
+
+REGION_LINE = re.compile(r'#(?:end)?region(?![A-Za-z0-9_])[^\n]*\n?')
+"""a whole #region or #endregion line, newline included, like handle_directive reads it"""
+
+
+def line_comment_end (src: str, pos: int) -> int:
+	"""where a // comment starting at `pos` ends, not counting its newline"""
+	if (end:=src.find('\n', pos)) < 0:
+		return len(src)
+	return end
+
+
+def parse_number (spelling: str) -> TokenType:
+	"""
+	the token for a number literal from how its written, hex ones are a
+	`$` and their digits whichever way they were written. See `Constants`
+	"""
+	match spelling[0]:
+		case '$':
+			return NumberLiteralToken(int(spelling[1:].replace('_', ''), 16))
+		case '#':
+			name = spelling[1:].replace('_', '')
+			if (l:=len(name)) > 6:
+				raise ParseNumberError(f'Too many digits for hex colour code #{name}!')
+			elif l < 6:
+				raise ParseNumberError(f'Not enough digits for hex colour code #{name}!')
+			value = int(name, 16)
+			return NumberLiteralToken(((value>>16)&0xFF)|(value&0x00FF00)|((value&0xFF)<<16))
+	if spelling[1:2] in ('b', 'B') and spelling[0] == '0':
+		return NumberLiteralToken(int(spelling[2:].replace('_', ''), 2))
+	elif '.' in spelling:
+		return NumberLiteralToken(float(spelling.replace('_', '')))
+	return NumberLiteralToken(int(spelling.replace('_', '')))
+
+
+def _literal_size (tk: TokenType) -> int:
+	# not counting its __dict__, touching that makes python actually build one
+	value = tk.value if isinstance(tk, NumberLiteralToken) else tk.string
+	return sys.getsizeof(tk) + sys.getsizeof(value)
+
+
+class Constants:
+	"""
+	`Symbols` for number & string literals: every literal by how its
+	written, so one thats been seen before isnt parsed again and all of
+	them share the one (frozen) token. Strings go by their body, which
+	for the ones without escapes is the exact same str as the tokens.
+	Pass the same one to more than one tokenize to pool a whole project
+	"""
+	def __init__ (self):
+		self.numbers = dict[str, TokenType]()
+		self.strings = dict[str, TokenType]()
+		self.verbatim = dict[str, TokenType]()
+		"""@"" strings, theyre not escaped so they cant share with `strings`"""
+		self.lookups = 0
+		self.bytes = 0
+		"""roughly how much memory the pooled tokens take up"""
+
+	def __len__ (self):
+		return len(self.numbers) + len(self.strings) + len(self.verbatim)
+
+	def _add (self, tk: TokenType) -> TokenType:
+		self.bytes += _literal_size(tk)
+		return tk
+
+	def number (self, spelling: str) -> TokenType:
+		self.lookups += 1
+		if (tk:=self.numbers.get(spelling)) is None:
+			tk = self.numbers[spelling] = self._add(parse_number(spelling))
+		return tk
+
+	def string (self, body: str, verbatim=False) -> TokenType:
+		"""`body` is between the quotes, as written"""
+		self.lookups += 1
+		pool = self.verbatim if verbatim else self.strings
+		if (tk:=pool.get(body)) is None:
+			tk = pool[body] = self._add(StringLiteralToken(body if verbatim else mth.digest_string(body)))
+		return tk
+
+	def merge (self, other: 'Constants') -> dict[int, TokenType]:
+		"""
+		pools everything in `other` (from lexing in another process, say)
+		in here too, as if it had been lexed with this one. Gives back what
+		each of `other`s tokens, by id, is pooled as now
+		"""
+		pooled = dict[int, TokenType]()
+		self.lookups += other.lookups
+		for mine, theirs in ((self.numbers, other.numbers), (self.strings, other.strings), (self.verbatim, other.verbatim)):
+			for key, tk in theirs.items():
+				if (have:=mine.get(key)) is None:
+					have = mine[key] = self._add(tk)
+				pooled[id(tk)] = have
+		return pooled
+
+	@property
+	def hits (self):
+		return self.lookups - len(self)
+
+	@property
+	def saved_bytes (self) -> int:
+		"""
+		roughly the memory the literals that were already in here would
+		have taken up as tokens of their own, going by the average size
+		of the ones that are
+		"""
+		return self.hits * self.bytes // len(self) if len(self) else 0
+
+	def stats (self) -> dict[str, float]:
+		return {
+			'literals': self.lookups,
+			'unique': len(self),
+			'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+			'pool_bytes': self.bytes,
+			'saved_bytes': self.saved_bytes,
+		}
+
+
+# for handlers called without a pool
+
+def _number (constants: Constants|None, spelling: str) -> TokenType:
+	if constants is None:
+		return parse_number(spelling)
+	return constants.number(spelling)
+
+
+def _string (constants: Constants|None, body: str, verbatim=False) -> TokenType:
+	if constants is None:
+		return StringLiteralToken(body if verbatim else mth.digest_string(body))
+	return constants.string(body, verbatim)
+
+
+def read_hex_number (f: StringReader, constants: Constants|None=None) -> TokenType:
+	return _number(constants, '$' + f.take_hex())
+
+
+def read_css_colour (f: StringReader, constants: Constants|None=None) -> TokenType:
+	return _number(constants, '#' + f.take_hex())
+
+
+_MACRO_STOPS = re.compile(r'[\\\n]|\r(?=\n)')
 
 
 def handle_macro (f: StringReader) -> TokenType:
@@ -71,40 +268,39 @@ def handle_macro (f: StringReader) -> TokenType:
 			else:
 				raise ParseError(f'Macro parse error: Unexpected symbol {ch} in ident!')
 		else:
-			return f.take_while(mth.is_identifier)
+			return f.take_identifier()
 
-	f.take_while(KINDA_WHITESPACE)
+	f.skip_gml_whitespace()
 	ident1 = try_read_id()
 	if f.vore(':'):
 		macrotoken = MacroToken(name=try_read_id(), configuration=ident1)
 	else:
 		macrotoken = MacroToken(name=ident1)
 
-	f.take_while(KINDA_WHITESPACE)
-
-	# this is dumb
-	def pred (ch: str) -> bool:
-		if ch == '\\':
-			f.skip()
-			if f.vore_newline():
-				return True
-			else:
-				raise ParseError('Expected newline after continuator symbol in macro!')
-		elif ch == '\r':
-			if f.peek(1) == '\n':
-				return False
-		elif ch == '\n' or ch == '':
-			return False
-		return True
-
-	body = f.take_while(pred)
+	f.skip_gml_whitespace()
+
+	# up to the end of the line, jumping from \ to \ on the way. The
+	# character right after a continuation is part of the body whatever
+	# it is
+	src = f.text
+	start = pos = f.tell()
+	search = _MACRO_STOPS.search
+	while (m:=search(src, pos)) is not None and src[m.start()] == '\\':
+		f.goto(m.start() + 1)
+		if not f.vore_newline():
+			raise ParseError('Expected newline after continuator symbol in macro!')
+		pos = f.tell() + 1
+	# a continuation right at the end of the text goes one past it
+	f.goto(m.start() if m is not None else max(pos, len(src)))
+	body = f.substr_from(start)
 	if body.endswith('\\'):
 		body += '\n'
-	macrotoken.body = tokenize(body, True)
+	# tokenized when (if) its used, see MacroToken.body
+	macrotoken.source = body
 	return macrotoken
 
 
-def handle_number (f: StringReader) -> TokenType:
+def handle_number (f: StringReader, constants: Constants|None=None) -> TokenType:
 	start = f.tell()
 	ch = f.read()
 
@@ -118,12 +314,11 @@ def handle_number (f: StringReader) -> TokenType:
 	if not is_float and ch == '0':
 		# might be parsing a hex or binary literal
 		if f.vore('xX'): # hexliteral
-			return read_hex_number(f)
+			return read_hex_number(f, constants)
 		elif f.vore('bB'): # binliteral
-			start = f.tell()
-			f.take_while(mth.is_allowed_number_bin)
-			return NumberLiteralToken(int(f.substr_from(start).replace('_', ''), 2))
-	f.take_while(mth.is_allowed_number_lit)
+			f.skip_run(mth.number_bin_run)
+			return _number(constants, f.substr_from(start))
+	f.skip_digits()
 
 	if f.peek() == '.':
 		if is_float:
@@ -134,300 +329,371 @@ def handle_number (f: StringReader) -> TokenType:
 	# still try to take more regardless of whether we know the number
 	# is a float or not, as the numeric literal might leave off the
 	# trailing dot; IE, `1.`
-	f.take_while(mth.is_allowed_number_lit)
-	if is_float:
-		return NumberLiteralToken(float(f.substr_from(start).replace('_', '')))
-	else:
-		return NumberLiteralToken(int(f.substr_from(start).replace('_', '')))
+	f.skip_digits()
+	# its a float if theres a . in it
+	return _number(constants, f.substr_from(start))
+
 
+_STRING_BODY = re.compile(r'(?:[^"\\\n]|\\[^\n])*+')
+"""a string up to its closing ", a \\ always takes the next character with it"""
 
-def handle_string (f: StringReader, is_multiline: bool):
+_TEMPLATE_STOPS = re.compile(r'[\n\\{}"]')
+
+
+def handle_string (f: StringReader, is_multiline: bool, constants: Constants|None=None):
+	src = f.text
 	start = f.tell()
 	if is_multiline:
-		while (ch:=f.peek()) != '':
-			if ch == '"':
-				tk = StringLiteralToken(f.substr_from(start))
-				f.skip() # trailing "
-				return tk
-			f.skip()
-		raise ParseError('Unclosed string')
-	else:
-		# im not actually sure why newlines arent fine in GML. theyd have
-		# to explicitly check and stop parsing a string if they encounter a newline.
-		# maybe their tokenizer works on individual lines hrm.
-		while f.can_read():
-			if f.vore_newline():
-				raise ParseError('String broken by newline')
-			elif f.peek() == '"':
-				if f.prev() == '\\':
-					f.skip()
-					continue
-				tk = StringLiteralToken(mth.digest_string(f.substr_from(start)))
-				f.skip() # trailing "
-				return tk
-			f.skip()
+		if (end:=src.find('"', start)) < 0:
+			f.goto(len(f))
+			raise ParseError('Unclosed string')
+		f.goto(end + 1) # trailing "
+		return _string(constants, src[start:end], True)
+
+	# im not actually sure why newlines arent fine in GML. theyd have
+	# to explicitly check and stop parsing a string if they encounter a newline.
+	# maybe their tokenizer works on individual lines hrm.
+	end = _STRING_BODY.match(src, start).end()
+	if src[end:end+1] != '"':
+		# either a newline or the end of the text, maybe with a \ before it
+		if src[end:end+1] == '\\':
+			end += 1
+		if src[end:end+1] == '\n':
+			f.goto(end + 1)
+			raise ParseError('String broken by newline')
+		f.goto(len(f))
 		raise ParseError('Unclosed string')
+	f.goto(end + 1) # trailing "
+	return _string(constants, src[start:end])
 
 
-def handle_string_template (f: StringReader):
+def handle_string_template (f: StringReader, constants: Constants|None=None):
 	#TODO:
 	#	do string templ have escape seqs for { and }?
 	#	how does it handled unclosed {?
 
-	# Maybe a little silly to duplicate code like this but uh.
-	# ._. i dont care its easier
-	start = f.tell()
+	# only stops on the characters that do something, the text between
+	# them is jumped over
+	src = f.text
+	start = pos = f.tell()
 	depth = 0
 	mark = -1
-	bracket_slices = list[slice]()
-	while f.can_read():
-		if f.vore_newline():
-			if depth == 0:
-				raise ParseError('String broken by newline')
-			continue
-		elif f.vore('\\', '"'):
-			pass
-		elif f.vore('{'):
-			if depth == 0:
-				mark = f.tell()-start
-			depth += 1
-			continue
-		elif f.vore('}'):
-			depth -= 1
-			if depth < 0:
-				depth = 0
-			elif depth == 0:
-				bracket_slices.append(slice(mark, f.tell()-1-start))
-			continue
-		elif f.peek() == '"':
-			if depth != 0:
-				f.skip()
+	bodies = list[slice]()
+	search = _TEMPLATE_STOPS.search
+	while (m:=search(src, pos)) is not None:
+		p = m.start()
+		ch = src[p]
+		pos = p + 1
+		if ch == '\\':
+			# \{ and \} still open & close a block, anything else is escaped
+			ch = src[p+1:p+2]
+			pos = p + 2
+			if ch != '{' and ch != '}':
 				continue
-			if len(bracket_slices) == 0:
-				# string contains no expression blocks, treat it
-				# as a regular str literal
-				tk = StringLiteralToken(mth.digest_string(f.substr_from(start)))
-				f.skip() # trailing "
+		match ch:
+			case '\n':
+				if depth == 0:
+					f.goto(pos)
+					raise ParseError('String broken by newline')
+			case '{':
+				if depth == 0:
+					mark = pos
+				depth += 1
+			case '}':
+				if depth > 0:
+					depth -= 1
+					if depth == 0:
+						bodies.append(slice(mark, pos-1))
+			case _ if depth == 0:
+				f.goto(pos) # trailing "
+				if len(bodies) == 0:
+					# string contains no expression blocks, treat it
+					# as a regular str literal
+					return _string(constants, src[start:p])
+				# each block becomes its index in the string
+				tk = StringTemplateToken()
+				parts = list[str]()
+				last = start
+				for i, body in enumerate(bodies):
+					parts += src[last:body.start], str(i)
+					tk.sources.append(src[body])
+					last = body.stop
+				parts.append(src[last:p])
+				tk.string = mth.digest_string(''.join(parts))
 				return tk
-			# operate on the string backwards, so that
-			# slices dont have to be recalculated
-			text = list(f.substr_from(start))
-			f.skip() # trailing "
-			tk = StringTemplateToken()
-			i = len(bracket_slices) - 1
-			for body in reversed(bracket_slices):
-				tk.bodies.insert(0, tokenize(''.join(text[body])))
-				text[body] = str(i)
-				i -= 1
-			tk.string = mth.digest_string(''.join(text))
-			return tk
-		f.skip()
+	f.goto(len(f))
 	raise ParseError('Unclosed string')
 
 
-def tokenize (src: str, handle_whack_as_newline=False) -> Tokens:
+def handle_directive (f: StringReader, begin: int, constants: Constants|None=None) -> TokenType:
+	# this isnt particuarly efficient -_- but whatever
+	#TODO: This method is sort of complicated, im not sure how to
+	#	report an error between an unknown preproc directive or a
+	#	problem with parsing a hex colour
+	start = f.tell()
+	name = f.take_identifier()
+	if name == 'macro':
+		return handle_macro(f)
+	elif name == 'region':
+		f.skip_gml_whitespace()
+		return RegionToken(False, f.rest_of_line(), f.text) # skips newline
+	elif name == 'endregion':
+		f.skip_gml_whitespace()
+		return RegionToken(True, f.rest_of_line(), f.text) # skips newline
+	elif name == '':
+		raise ParseError(f'Unexpected # in stream @{begin}!')
+	elif mth.number_hex_chars.issuperset(name):
+		f.goto(start)
+		return read_css_colour(f, constants)
+	else:
+		raise ParseError(f'Unknown preprocessor directive "#{name}" @ {begin}!')
+
+
+WORD_TOKENS = {
+	name: func(name) if callable(func) else KeywordToken(name)
+	for name, func in gml_keywords.items()
+} | {
+	'argument': ScriptArgumentToken(-1),
+} | {
+	f'argument{i}': ScriptArgumentToken(i) for i in range(16)
+}
+"""
+every word that isnt an identifier, already made. Theyre all immutable,
+so one of each gets shared between everything that uses it
+"""
+
+
+def word_token (name: str) -> TokenType | TK:
+	if (tk:=WORD_TOKENS.get(name)) is not None:
+		return tk
+	# lstrip takes a set of chars, so this catches argumentt5 & co too
+	if name.startswith('argument'):
+		idx = name.lstrip('argument')
+		if len(idx) == 0:
+			return WORD_TOKENS['argument']
+		try:
+			idx = int(idx)
+			if idx in range(0, 16):
+				return WORD_TOKENS[f'argument{idx}']
+		except ValueError:
+			pass
+	return IdentifierToken(name)
+
+
+class Symbols(dict[str, TokenType | TK]):
+	"""
+	The token every word seen so far turned into, for one tokenization.
+	`symbols[name]` makes it the first time, so after that the same name
+	is always the same (immutable) token, and the same string
+	"""
+	def __missing__ (self, name: str):
+		tk = self[name] = word_token(name)
+		return tk
+
+
+def tokenize (
+	src: str,
+	handle_whack_as_newline=False,
+	fast=False,
+	trace: Trace|None=None,
+	stats: LexStats|None=None,
+	skip_trivia=False,
+	recover=False,
+	constants: Constants|None=None,
+) -> Tokens:
+	"""
+	`trace` gets called with every token as its added (`instrument.log_trace`
+	logs them), and `stats` gets its counters filled in. Both are off
+	by default and dont cost anything when they are.
+
+	`skip_trivia` leaves out comments, regions and newlines, theyre jumped
+	over without ever being made into tokens.
+
+	`recover` keeps going when something doesnt lex, it becomes an
+	`ErrorToken` and lexing starts again at the next newline (see `resync`).
+	`Tokens.diagnostics` lists them all afterwards.
+
+	Literals spelled the same share one token from `constants`, which is
+	a new `Constants` just for this tokenize if its not given
+	"""
+	if fast:
+		# table driven scanner, see scanner.py
+		from scanner import scan
+		return scan(src, handle_whack_as_newline, trace, stats, skip_trivia=skip_trivia, recover=recover, constants=constants)
 	f = StringReader(src)
-	tokens = Tokens()
+	tokens = Tokens(source=src)
+	symbols = Symbols()
+	if constants is None:
+		constants = Constants()
 	begin = 0
-
-	def take_newl (ch:str):
-		if ch == '\r':
-			if f.vore('\n'):
-				return False
-		elif ch == '\n':
-			return False
-		return True
+	# where each line starts, noted down as newlines get lexed
+	lines = array('i', [0])
+	mark = started = perf_counter() if stats is not None else 0
 
 	def add (tk: TokenType | TK, *metadata):
-		nonlocal tokens
-		tokens += tk
-		sl = slice(begin, f.tell())
-		print(f'{tk}:\n\t{sl}\n\t[{', '.join(map(repr,metadata))}]')
+		nonlocal mark
+		# comments & regions skip past the end of the text when theres
+		# no newline after them
+		end = min(f.tell(), len(f))
+		tokens.append(tk, begin, end)
+		if trace is not None:
+			trace(tk, slice(begin, end), metadata)
+		if stats is not None:
+			t = perf_counter()
+			stats.record(tk, t - mark)
+			mark = t
 
 	while f.can_read():
-		f.take_while(KINDA_WHITESPACE)
+		f.skip_gml_whitespace()
 		begin, ch = f.tell_read()
-		match ch:
-			case '':
-				break
-			#TODO:
-			#	these two should RLE encode how many newlines in a row there were
-			#	mostly because the *number* of newlines doesnt rlly matter ._.
-			case ('\r' | '\n') if f.vore_pev_newline():
-				add(TK.NEWLINE)
-			case '\\':
-				if not handle_whack_as_newline:
-					raise ParseError('Unexpected backslash in stream!')
-				if f.vore_newline():
-					add(TK.NEWLINE)
-				else:
-					raise ParseError('Expected newline after backslash continuator!')
-			case '/':
-				if f.vore('/'):
-					add(CommentToken(f.take_while(take_newl, 1), False))
-				elif f.vore('*'):
+		try:
+			match ch:
+				case '':
+					break
+				# the whole run of them, blank lines and all, in one go
+				case ('\r' | '\n') if (m:=NEWLINE_RUN.match(src, begin)):
+					f.goto(m.end())
+					note_lines(src, begin, m.end(), lines)
+					if not skip_trivia:
+						add(newline_run(m.group().count('\n')))
+				case '\\':
+					if not handle_whack_as_newline:
+						raise ParseError('Unexpected backslash in stream!')
+					if not f.vore_newline():
+						raise ParseError('Expected newline after backslash continuator!')
+					lines.append(f.tell())
+					if not skip_trivia:
+						add(newline_run(1))
+				case '/' if f.vore('/'):
+					start = f.tell()
+					end = line_comment_end(src, start)
+					f.goto(end + 1) # and the newline
+					if end < len(src):
+						lines.append(end + 1)
+					if not skip_trivia:
+						add(CommentToken(slice(start, end), False, src))
+				case '/' if f.vore('*'):
 					start = f.tell()
 					read_multiline_comment(f)
-					add(CommentToken(f.text[start : f.tell()-2], True))
-				elif f.vore('='):
-					add(InplaceOpToken(InplaceKind.DIV))
-				else:
-					add(TK.SLASH)
-			case '.':
+					note_lines(src, start, f.tell(), lines)
+					if not skip_trivia:
+						add(CommentToken(slice(start, f.tell()-2), True, src))
+				case '#' if skip_trivia and (m:=REGION_LINE.match(src, begin)):
+					f.goto(m.end())
+					note_lines(src, begin, m.end(), lines)
 				# might be reading a decimal number that omits the leading 0
-				if mth.is_number(f.peek()):
+				case '.' if mth.is_number(f.peek()):
 					f.rewind()
-					add(handle_number(f))
-				else:
-					add(TK.DOT)
-			case '"':
-				add(handle_string(f, False))
-			case '@':
-				if f.vore('"'):
-					add(handle_string(f, True))
-				else:
-					raise ParseError('Unexpected @ in stream!')
-			case '$':
-				if f.vore('"'):
-					add(handle_string_template(f))
-				else:
-					if mth.is_allowed_number_hex(f.peek()):
-						add(read_hex_number(f))
-					else:
-						raise ParseError('Unexpected midas hotkey in $tream!')
-			case '?':
-				if f.vore('?'):
-					if f.vore('='):
-						add(InplaceOpToken(InplaceKind.NULL))
+					add(handle_number(f, constants))
+				case '"':
+					add(handle_string(f, False, constants))
+				case '@':
+					if f.vore('"'):
+						add(handle_string(f, True, constants))
+						note_lines(src, begin, f.tell(), lines)
 					else:
-						add(TK.NULLISH)
-				else:
-					add(TK.QUESTO)
-			case '~': add(TK.BITWISE_NOT, WordSymbolKind.SYMBOL)
-			case '!':
-				if f.vore('='):
-					add(TK.INEQUALITY)
-				else:
-					add(LogicNotToken(False))
-			case '=':
-				if f.vore('='):
-					add(TK.EQUALITY)
-				else:
-					add(TK.EQUALS)
-			case '{': add(LBraceToken(), WordSymbolKind.SYMBOL)
-			case '}': add(RBraceToken(), WordSymbolKind.SYMBOL)
-			case '(': add(TK.L_WHIFFLE)
-			case ')': add(TK.R_WHIFFLE)
-			case '[':
-				if   f.vore('|'): add(TK.ACCESS_DS_LIST)
-				elif f.vore('?'): add(TK.ACCESS_DS_MAP)
-				elif f.vore('#'): add(TK.ACCESS_DS_GRID)
-				elif f.vore('@'): add(TK.ACCESS_ARRAY)
-				elif f.vore('$'): add(TK.ACCESS_STRUCT)
-				else: add(TK.L_BRACKET)
-			case ']': add(TK.R_BRACKET)
-			case ',': add(TK.COMMA)
-			case ':': add(TK.COLON)
-			case ';': add(TK.SEMICOLON)
-			case '+':
-				if   f.vore('='): add(InplaceOpToken(InplaceKind.ADD))
-				elif f.vore('+'): add(TK.INCR)
-				else: add(TK.PLUS)
-			case '-':
-				if   f.vore('='): add(InplaceOpToken(InplaceKind.SUB))
-				elif f.vore('-'): add(TK.DECR)
-				else: add(TK.MINUS)
-			case '*':
-				if f.vore('='): add(InplaceOpToken(InplaceKind.MUL))
-				else:           add(TK.STAR)
-			case '%':
-				if f.vore('='): add(InplaceOpToken(InplaceKind.MOD))
-				else:           add(TK.PERCENT)
-			case '&':
-				if   f.vore('&'): add(AndToken(False), WordSymbolKind.SYMBOL)
-				elif f.vore('='): add(InplaceOpToken(InplaceKind.AND))
-				else: add(TK.BITWISE_AND)
-			case '|':
-				if   f.vore('|'): add(OrToken(False), WordSymbolKind.SYMBOL)
-				elif f.vore('='): add(InplaceOpToken(InplaceKind.OR))
-				else: add(TK.BITWISE_OR)
-			case '^':
-				if   f.vore('^'): add(XorToken(False), WordSymbolKind.SYMBOL)
-				elif f.vore('='): add(InplaceOpToken(InplaceKind.XOR))
-				else: add(TK.BITWISE_XOR)
-			case '<':
-				if f.vore('='):
-					add(TK.LESS_EQUAL)
-				elif f.vore('<'):
-					if f.vore('='):
-						add(InplaceOpToken(InplaceKind.LSH))
+						raise ParseError('Unexpected @ in stream!')
+				case '$':
+					if f.vore('"'):
+						add(handle_string_template(f, constants))
+						note_lines(src, begin, f.tell(), lines)
 					else:
-						add(TK.L_SHIFT)
-				else:
-					add(TK.LESS_THAN)
-			case '>':
-				if f.vore('='):
-					add(TK.GREATER_EQUAL)
-				elif f.vore('>'):
-					if f.vore('='):
-						add(InplaceOpToken(InplaceKind.RSH))
-					else:
-						add(TK.R_SHIFT)
-				else:
-					add(TK.GREATER_THAN)
-			case '#':
-				# this isnt particuarly efficient -_- but whatever
-				#TODO: This method is sort of complicated, im not sure how to
-				#	report an error between an unknown preproc directive or a
-				#	problem with parsing a hex colour
-				name = f.take_while(mth.is_identifier)
-				if name == 'macro':
-					add(handle_macro(f))
-				elif name == 'region':
-					f.take_while(KINDA_WHITESPACE)
-					add(RegionToken(False, f.take_while(RegionToken.pred, 1))) # skips newline
-				elif name == 'endregion':
-					f.take_while(KINDA_WHITESPACE)
-					add(RegionToken(True, f.take_while(RegionToken.pred, 1))) # skips newline
-				elif name == '':
-					raise ParseError(f'Unexpected # in stream @{begin}!')
-				elif all(map(mth.is_allowed_number_hex, name)):
-					f.seek(begin + 1)
-					add(read_css_colour(f))
-				else:
-					raise ParseError(f'Unknown preprocessor directive "#{name}" @ {begin}!')
-			case _:
-				if mth.is_letter(ch) or ch == '_':
-					f.rewind()
-					name = f.take_while(mth.is_identifier)
-					if name in gml_keywords:
-						if callable(func:=gml_keywords[name]):
-							add(func(name))
+						if mth.is_allowed_number_hex(f.peek()):
+							add(read_hex_number(f, constants))
 						else:
-							add(KeywordToken(name))
+							raise ParseError('Unexpected midas hotkey in $tream!')
+				case '#':
+					# macros with \ continuations, regions eat their newline
+					add(handle_directive(f, begin, constants))
+					note_lines(src, begin, f.tell(), lines)
+				case _ if ch in OPERATOR_TRIE:
+					# longest match, see tokens.OPERATORS
+					tk, end = OPERATOR_TRIE.match(src, begin)
+					f.goto(end)
+					add(tk)
+				case _:
+					if mth.is_letter(ch) or ch == '_':
+						f.rewind()
+						add(symbols[f.take_identifier()])
+					elif mth.is_number(ch):
+						f.rewind()
+						add(handle_number(f, constants))
 					else:
-						if name.startswith('argument'):
-							idx = name.lstrip('argument')
-							if len(idx) == 0:
-								add(ScriptArgumentToken(-1))
-								continue
-							try:
-								idx = int(idx)
-								if idx in range(0, 16):
-									add(ScriptArgumentToken(idx))
-									continue
-							except ValueError:
-								pass
-						add(IdentifierToken(name))
-				elif mth.is_number(ch):
-					f.rewind()
-					add(handle_number(f))
-				else:
-					raise ParseError(f'Unexpected character in stream "{repr(ch)}"')
+						raise ParseError(f'Unexpected character in stream "{repr(ch)}"')
+		except LEX_ERRORS as e:
+			if not recover:
+				locate_error(e, src, begin, lines)
+				raise
+			f.goto(resync(src, begin, f.tell()))
+			note_lines(src, begin, f.tell(), lines)
+			add(ErrorToken(str(e)))
+	if stats is not None:
+		stats.finish(len(src), perf_counter() - started)
+	tokens.lines = LineIndex(src, lines)
 	return tokens
 
 
-def main (targ: str|Path):
-	tokens = tokenize(Path(targ).read_text('utf8'))
+def iter_tokens (source: str|TextIO, handle_whack_as_newline=False, chunk_size=1<<16) -> Iterator[TokenType | TK]:
+	"""
+	Yields the same tokens `tokenize` would return, as soon as theyre
+	recognized. `source` can be a string, or a text stream which gets
+	read `chunk_size` characters at a time, with whatever token is cut
+	off at the end of a chunk carried over into the next one
+	"""
+	from scanner import scan_from
+	if isinstance(source, str):
+		yield from scan_from(source, 0, handle_whack_as_newline)
+		return
+	symbols = Symbols()
+	constants = Constants()
+	buf = ''
+	base = 0
+	want = chunk_size
+	while True:
+		chunk = source.read(want)
+		final = chunk == ''
+		buf += chunk
+		pos = yield from scan_from(buf, 0, handle_whack_as_newline, final, base, symbols=symbols, constants=constants)
+		if final:
+			return
+		# a token bigger than a chunk (long comments, strings) would get
+		# rescanned over and over, so read more at once until it fits
+		want = chunk_size if pos > 0 else max(chunk_size, len(buf))
+		buf = buf[pos:]
+		base += pos
+
+
+def profile (src: str, handle_whack_as_newline=False, fast=False) -> tuple[Tokens, LexStats]:
+	stats = LexStats()
+	return tokenize(src, handle_whack_as_newline, fast, stats=stats), stats
+
+
+def main (
+	targ: str|Path, fast=False, compact=False, trace: Trace|None=None, stats: LexStats|None=None,
+	mapped=False, workers: int|None=None, recover=False, constants: Constants|None=None,
+):
+	"""
+	`mapped` lexes an mmap of the file as utf8 bytes instead of reading it
+	all in as text first (see `scanner.scan_file`), the spans are byte
+	offsets then. `workers` splits big files up and lexes the pieces on
+	that many processes (see parallel.py). `recover` and `constants` are
+	the same as for `tokenize`, they only work when lexing text. The
+	others cant be used along with `workers`, except for `fast` which
+	doesnt change the tokens
+	"""
+	if workers is not None:
+		if mapped or compact or trace is not None or stats is not None:
+			raise ValueError('workers cant be used with mapped, compact, trace or stats')
+		from parallel import tokenize_parallel
+		tokens = tokenize_parallel(Path(targ).read_text('utf8'), workers, recover=recover, constants=constants)
+	elif mapped:
+		from scanner import scan_file
+		tokens = scan_file(targ, trace=trace, stats=stats)
+	elif compact:
+		# struct of arrays storage, see tokarray.py
+		from tokarray import ArrayTokens
+		tokens = ArrayTokens.from_source(Path(targ).read_text('utf8'), recover=recover, constants=constants)
+	else:
+		tokens = tokenize(Path(targ).read_text('utf8'), fast=fast, trace=trace, stats=stats, recover=recover, constants=constants)
 	tokens += EOF()
 	return tokens
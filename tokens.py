@@ -1,3 +1,7 @@
+import re
+from array import array
+from bisect import bisect_right
+from collections.abc import MutableSequence
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any
@@ -78,7 +82,9 @@ class Scope(TokenType):
 	def __str__ (self):
 		return f'< {self.kind.name}. >'
 
-@dataclass
+# frozen, since the tokenizer shares one of each between every use
+# (see tokenizer.WORD_TOKENS & Symbols)
+@dataclass(frozen=True)
 class DualWordSymbolToken(TokenType):
 	was_word: bool = False
 
@@ -98,13 +104,144 @@ def self_literal (kind: Scope.Kind):
 def accessor_token (kind: Accessor.Kind):
 	return Accessor(kind)
 
+def slice_source (source: str|bytes, where: slice) -> str:
+	"""
+	`source[where]`, for sources that are str or utf8 bytes (byte mode
+	lexing, see `scanner.scan_bytes`), which get decoded here and only here
+	"""
+	text = source[where]
+	return text if isinstance(text, str) else text.decode('utf8')
+
+class LineIndex:
+	"""
+	Where each line of a text starts, so an offset can be turned into a
+	line & column (and back) with a bisect instead of counting newlines.
+	Both count from 0, like offsets. \r\n and \n both end a line at the \n,
+	the \r is just the last column of its line. For utf8 bytes (see
+	`slice_source`) the columns are in bytes too.
+
+	The lexers note down where lines start as they go (see `note_lines`)
+	and hand them over as `starts`, theyre only looked for when theres none
+	"""
+	def __init__ (self, source: str|bytes, starts: array|None=None):
+		self.source = source
+		if starts is not None:
+			self.starts = starts
+			return
+		self.starts = array('i', [0])
+		# one C level pass, nothing but newlines to stop on
+		self.starts.extend(m.end() for m in re.finditer('\n' if isinstance(source, str) else b'\n', source))
+
+	def __len__ (self):
+		return len(self.starts)
+
+	def line_col (self, offset: int) -> tuple[int, int]:
+		line = bisect_right(self.starts, offset) - 1
+		return line, offset - self.starts[line]
+
+	def offset (self, line: int, col: int) -> int:
+		if not 0 <= line < len(self.starts):
+			raise IndexError(f'No line {line}, theres only {len(self.starts)}')
+		start = self.starts[line]
+		# up to and including its newline, the last line goes to the end of the text
+		last = self.starts[line+1] - 1 if line + 1 < len(self.starts) else len(self.source)
+		if not 0 <= col <= last - start:
+			raise IndexError(f'No column {col} on line {line}')
+		return start + col
+
+	def describe (self, offset: int) -> str:
+		"""`line:col` for people, who count from 1"""
+		line, col = self.line_col(offset)
+		return f'{line + 1}:{col + 1}'
+
+
+def note_lines (src: str|bytes, start: int, end: int, lines: MutableSequence[int], newline: str|bytes='\n'):
+	"""appends where each line starting in `src[start:end]` starts to `lines`"""
+	while (i:=src.find(newline, start, end)) >= 0:
+		start = i + 1
+		lines.append(start)
+
+
 class Tokens(list[TokenType]):
+	"""
+	Along with the tokens themselves this keeps where each one is in
+	`source`, in `starts` & `ends`. Only `append` and `+=` keep those in
+	step, anything else that changes the list has to handle them itself.
+	Tokens that didnt come from the tokenizer (`EOF`) are at -1.
+	`source` can also be utf8 bytes (or an mmap of them), then the
+	offsets are in bytes too
+	"""
+	def __init__ (self, tokens=(), source: str|bytes|None=None):
+		super().__init__(tokens)
+		self.source = source
+		self.starts = array('i', [-1]) * len(self)
+		self.ends = array('i', [-1]) * len(self)
+
+	def append (self, tk, start=-1, end=-1):
+		super().append(tk)
+		self.starts.append(start)
+		self.ends.append(end)
+
 	def __iadd__(self, other):
 		if isinstance(other, (TokenType, TK)):
 			self.append(other)
 			return self
+		if isinstance(other, Tokens):
+			self.starts.extend(other.starts)
+			self.ends.extend(other.ends)
+			return super().__iadd__(other)
+		other = list(other)
+		missing = array('i', [-1]) * len(other)
+		self.starts.extend(missing)
+		self.ends.extend(missing)
 		return super().__iadd__(other)
 
+	def span (self, index: int) -> tuple[int, int] | None:
+		if (start:=self.starts[index]) < 0:
+			return None
+		return start, self.ends[index]
+
+	def location (self, index: int) -> slice | None:
+		if (start:=self.starts[index]) < 0:
+			return None
+		return slice(start, self.ends[index])
+
+	def text (self, index: int) -> str:
+		"""the source text of a token, sliced out on demand"""
+		if self.source is None or (loc:=self.location(index)) is None:
+			return ''
+		return slice_source(self.source, loc)
+
+	def token (self, index: int) -> Token:
+		return Token(self[index], location=self.location(index))
+
+	@property
+	def lines (self) -> LineIndex|None:
+		"""
+		a `LineIndex` for `source`, from the line starts the lexer noted
+		down, or made the first time its asked for if it didnt (and again
+		if `source` gets swapped out)
+		"""
+		if self.source is None:
+			return None
+		if (lines:=getattr(self, '_lines', None)) is None or lines.source is not self.source:
+			lines = self._lines = LineIndex(self.source)
+		return lines
+
+	@lines.setter
+	def lines (self, lines: LineIndex|None):
+		self._lines = lines
+
+	def line_col (self, index: int) -> tuple[int, int] | None:
+		"""the line & column the token at `index` starts at"""
+		if (start:=self.starts[index]) < 0 or (lines:=self.lines) is None:
+			return None
+		return lines.line_col(start)
+
+	def diagnostics (self) -> list[tuple[slice|None, str]]:
+		"""every `ErrorToken` in here and where it is"""
+		return [(self.location(i), tk.message) for i, tk in enumerate(self) if isinstance(tk, ErrorToken)]
+
 
 class TK(Enum):
 	L_BRACE = ()
@@ -197,6 +334,7 @@ class TK(Enum):
 	this is needed bc semicolons are not required terminators
 	for statements. Im not 100% on how GML handles
 	implicit semicolons though. -_-
+	(the lexers make a `NewlineToken` per run of them now)
 	"""
 
 	EOF = EOF()
@@ -204,91 +342,165 @@ class TK(Enum):
 	def is_special_accessor (self):
 		return isinstance(self.value, Accessor)
 
+	# the values are instances of classes local to simple_token & co,
+	# which cant be pickled, so pickle members by name instead
+	def __reduce_ex__ (self, proto):
+		return getattr, (TK, self.name)
+
 
 class CommentToken(TokenType):
 	"""
 	Comments are kept as tokens despite not being
 	syntactically meaningful. They are however used
-	for functor documentation & typing
+	for functor documentation & typing.
+
+	`contents` can be a slice of `source`, its only cut out when its used
 	"""
-	def __init__ (self, contents:str, was_multiline:bool):
-		self.contents = contents
+	def __init__ (self, contents:str|slice, was_multiline:bool, source:str|None=None):
+		self._contents = contents
+		self._source = source
 		self.multiline = was_multiline
+
+	@property
+	def contents (self) -> str:
+		if self._source is None:
+			return self._contents
+		return slice_source(self._source, self._contents)
+
 	def __str__ (self):
 		if self.multiline:
 			return f'< /* {repr(self.contents)} */ >'
 		return f'< // {repr(self.contents)} >'
 
-@dataclass
+@dataclass(frozen=True)
 class LBraceToken(DualWordSymbolToken): # {, begin
 	def __str__ (self): return f'< {'begin' if self.was_word else '{'} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class RBraceToken(DualWordSymbolToken): # }, end
 	def __str__ (self): return f'< {'end' if self.was_word else '}'} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class AndToken(DualWordSymbolToken):
 	def __str__ (self): return f'< {'and' if self.was_word else '&&'} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class OrToken(DualWordSymbolToken):
 	def __str__ (self): return f'< {'or' if self.was_word else '||'} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class XorToken(DualWordSymbolToken):
 	def __str__ (self): return f'< {'xor' if self.was_word else '^^'} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class InplaceOpToken(TokenType):
 	kind: InplaceKind
 	def __str__ (self): return f'< {self.kind.value} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class LogicNotToken(DualWordSymbolToken):
 	def __str__ (self): return f'< {'not' if self.was_word else '!'} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class ScriptArgumentToken(TokenType):
 	index: int
 	def __str__ (self): return f'< argument{'' if self.index < 0 else self.index} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class IdentifierToken(TokenType):
 	name: str
 	def __str__ (self): return f'< Ident: {self.name} >'
 
 
+@dataclass(frozen=True)
+class NewlineToken(TokenType):
+	"""
+	a run of `count` newlines in a row, blank lines (and whatever whitespace
+	is on them) included. \\r\\n counts the same as \\n. The number
+	of newlines doesnt rlly matter to the grammar, so a run is one token
+	"""
+	count: int = 1
+	def __str__ (self): return '< \\n >' if self.count == 1 else f'< \\n x{self.count} >'
+
+
+_NEWLINE_RUNS = dict[int, NewlineToken]()
+
+
+def newline_run (count: int) -> NewlineToken:
+	"""shared between everything that uses it, like the keyword tokens"""
+	if (tk:=_NEWLINE_RUNS.get(count)) is None:
+		tk = _NEWLINE_RUNS[count] = NewlineToken(count)
+	return tk
+
+
 @dataclass
+class ErrorToken(TokenType):
+	"""
+	where the text didnt lex, when lexing with `recover=True`. Its span is
+	from where the bad token started up to where lexing picked back up
+	"""
+	message: str
+	def __str__ (self): return f'< Error: {self.message} >'
+
+
 class RegionToken(TokenType):
-	is_end: bool
-	contents: str = field(default='')
+	"""same deal as `CommentToken`, `contents` can be a slice of `source`"""
+	def __init__ (self, is_end:bool, contents:str|slice='', source:str|None=None):
+		self.is_end = is_end
+		self._contents = contents
+		self._source = source
+
+	@property
+	def contents (self) -> str:
+		if self._source is None:
+			return self._contents
+		return slice_source(self._source, self._contents)
+
+	def __eq__ (self, other):
+		if not isinstance(other, RegionToken):
+			return NotImplemented
+		return self.is_end == other.is_end and self.contents == other.contents
+
+	def __repr__ (self):
+		return f'RegionToken(is_end={self.is_end!r}, contents={self.contents!r})'
+
 	def __str__ (self):
 		name = f'#{'end' if self.is_end else ''}region'
 		return f'< {name}{' '+repr(self.contents) if len(self.contents) > 0 else ''} >'
 
-	@staticmethod
-	def pred (ch: str): return ch != '\n'
-
 
 @dataclass
 class MacroToken(TokenType):
 	name: str
 	configuration: str = field(default=None)
-	body: list[TokenType] = field(default_factory=list)
+	source: str = field(default='')
+	"""the body as written, `body` tokenizes it the first time its used"""
+	_body: Tokens|None = field(default=None, init=False, repr=False, compare=False)
+
+	@property
+	def body (self) -> Tokens:
+		if self._body is None:
+			from tokenizer import tokenize
+			self._body = tokenize(self.source, True)
+		return self._body
 
 	def __str__ (self):
+		from tokenizer import LEX_ERRORS
 		main = f'#macro {self.name}' + (f', cfg:{self.configuration}' if self.has_config else '')
-		if len(self.body) != 0:
-			main += f', ({', '.join(map(str, self.body))})'
+		try:
+			if len(self.body) != 0:
+				main += f', ({', '.join(map(str, self.body))})'
+		except LEX_ERRORS:
+			# printing it shouldnt be where a bad body blows up, `body` is
+			main += f', {repr(self.source)}'
 		return f'< {main} >'
 
 	@property
@@ -296,19 +508,21 @@ class MacroToken(TokenType):
 		return self.configuration is not None
 
 
-@dataclass
+@dataclass(frozen=True)
 class KeywordToken(TokenType):
 	keyword: str
 	def __str__ (self): return f'< {self.keyword} >'
 
 
-@dataclass
+# frozen too, theyre shared between every literal spelled the same
+# (see tokenizer.Constants)
+@dataclass(frozen=True)
 class NumberLiteralToken(Literal):
 	value: float
 	def __str__ (self): return f'< Val: {self.value} >'
 
 
-@dataclass
+@dataclass(frozen=True)
 class StringLiteralToken(Literal):
 	string: str
 	def __str__ (self): return f'< Str: {repr(self.string)} >'
@@ -317,12 +531,120 @@ class StringLiteralToken(Literal):
 @dataclass
 class StringTemplateToken(Literal):
 	string:str         =field(default='')
-	bodies:list[Tokens]=field(default_factory=list)
+	sources:list[str]  =field(default_factory=list)
+	"""the text in each {}, `bodies` tokenizes them the first time theyre used"""
+	_bodies:list[Tokens]|None=field(default=None, init=False, repr=False, compare=False)
+
+	@property
+	def bodies (self) -> list[Tokens]:
+		if self._bodies is None:
+			from tokenizer import tokenize
+			self._bodies = [tokenize(src) for src in self.sources]
+		return self._bodies
 
 	def __str__ (self):
+		from tokenizer import LEX_ERRORS
 		main = f'${repr(self.string)}'
-		for body in self.bodies:
-			main += f', {{{', '.join(map(str, body))}}}'
+		try:
+			bodies = [', '.join(map(str, body)) for body in self.bodies]
+		except LEX_ERRORS:
+			# same as `MacroToken`, show them as written
+			bodies = list(map(repr, self.sources))
+		for body in bodies:
+			main += f', {{{body}}}'
 		return f'< {main} >'
 
 
+OPERATORS = {
+	'{': LBraceToken(False),
+	'}': RBraceToken(False),
+	'(': TK.L_WHIFFLE,
+	')': TK.R_WHIFFLE,
+	'[': TK.L_BRACKET,
+	']': TK.R_BRACKET,
+	'[|': TK.ACCESS_DS_LIST,
+	'[?': TK.ACCESS_DS_MAP,
+	'[#': TK.ACCESS_DS_GRID,
+	'[@': TK.ACCESS_ARRAY,
+	'[$': TK.ACCESS_STRUCT,
+	',': TK.COMMA,
+	'.': TK.DOT,
+	':': TK.COLON,
+	';': TK.SEMICOLON,
+	'?': TK.QUESTO,
+	'??': TK.NULLISH,
+	'??=': InplaceOpToken(InplaceKind.NULL),
+	'~': TK.BITWISE_NOT,
+	'!': LogicNotToken(False),
+	'!=': TK.INEQUALITY,
+	'=': TK.EQUALS,
+	'==': TK.EQUALITY,
+	'+': TK.PLUS,
+	'++': TK.INCR,
+	'+=': InplaceOpToken(InplaceKind.ADD),
+	'-': TK.MINUS,
+	'--': TK.DECR,
+	'-=': InplaceOpToken(InplaceKind.SUB),
+	'*': TK.STAR,
+	'*=': InplaceOpToken(InplaceKind.MUL),
+	'/': TK.SLASH,
+	'/=': InplaceOpToken(InplaceKind.DIV),
+	'%': TK.PERCENT,
+	'%=': InplaceOpToken(InplaceKind.MOD),
+	'&': TK.BITWISE_AND,
+	'&&': AndToken(False),
+	'&=': InplaceOpToken(InplaceKind.AND),
+	'|': TK.BITWISE_OR,
+	'||': OrToken(False),
+	'|=': InplaceOpToken(InplaceKind.OR),
+	'^': TK.BITWISE_XOR,
+	'^^': XorToken(False),
+	'^=': InplaceOpToken(InplaceKind.XOR),
+	'<': TK.LESS_THAN,
+	'<=': TK.LESS_EQUAL,
+	'<<': TK.L_SHIFT,
+	'<<=': InplaceOpToken(InplaceKind.LSH),
+	'>': TK.GREATER_THAN,
+	'>=': TK.GREATER_EQUAL,
+	'>>': TK.R_SHIFT,
+	'>>=': InplaceOpToken(InplaceKind.RSH),
+}
+"""
+every bit of punctuation and the token it becomes, which is shared by
+every use of it (theyre immutable). Both lexers go longest match first
+off of this, so a new operator only needs adding here. `//`, `/*` and
+`.5` are checked for before this is
+"""
+
+
+class OperatorTrie:
+	"""
+	`OPERATORS` as a tree of characters, so finding the longest operator at
+	some position is one dict lookup per character
+	"""
+	def __init__ (self, table: dict[str, TokenType | TK]):
+		# char -> [token ending here or None, children]
+		self.root = dict[str, list]()
+		for op, tk in table.items():
+			children = self.root
+			for ch in op[:-1]:
+				children = children.setdefault(ch, [None, {}])[1]
+			children.setdefault(op[-1], [None, {}])[0] = tk
+
+	def __contains__ (self, ch: str):
+		return ch in self.root
+
+	def match (self, text: str, pos: int) -> tuple[TokenType | TK, int] | None:
+		"""the longest operator at `text[pos:]` and where it ends, if theres one"""
+		children = self.root
+		found = None
+		end = len(text)
+		while pos < end and (node:=children.get(text[pos])) is not None:
+			pos += 1
+			if node[0] is not None:
+				found = node[0], pos
+			children = node[1]
+		return found
+
+
+OPERATOR_TRIE = OperatorTrie(OPERATORS)